@@ -93,6 +93,8 @@ DATABASES = {
 # Use recommended argon2 for password hashing
 # https://docs.djangoproject.com/en/3.0/topics/auth/passwords/#using-argon2-with-django
 PASSWORD_HASHERS = [
+    # Argon2 with XAUTH['ARGON2_PARAMETERS']. Reads(and upgrades) hashes of Django's `Argon2PasswordHasher`
+    'xauth.hashers.CalibratedArgon2PasswordHasher',
     'django.contrib.auth.hashers.Argon2PasswordHasher',
     'django.contrib.auth.hashers.PBKDF2PasswordHasher',
     'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
@@ -134,6 +136,30 @@ XAUTH = {
     'APP_NAME': 'Xently',
     'TOKEN_KEY': force_str(SECRET_KEY),
     'TOKEN_EXPIRY': timedelta(days=60),
+    # one of 'RS256', 'ES256', 'EdDSA'(Ed25519) or 'HS256'. ES256 & EdDSA are considerably cheaper to sign with
+    # and produce smaller tokens than RS256. See `python manage.py xauth_benchmark`
+    'TOKEN_SIGNING_ALGORITHM': 'RS256',
+    # 'full' includes all of the user's public fields in token payloads while 'compact' only includes the user's id,
+    # a payload version and the flags checked during authentication(is_active, is_verified, is_superuser, is_staff)
+    'TOKEN_PAYLOAD': 'full',
+    # one of 'ECDH-ES', 'dir' or 'A256KW'(all with A256GCM content encryption). 'dir' & 'A256KW' use a stored
+    # symmetric key and skip the ECDH key agreement. Only suitable when the token issuer also verifies the tokens.
+    # Tokens encrypted with either algorithm are accepted to ease migration
+    'TOKEN_ENCRYPTION_ALGORITHM': 'ECDH-ES',
+    # if True, RS256 signed and ECDH-ES(A256GCM) encrypted tokens are encoded & decoded with `cryptography` directly
+    # instead of jwcrypto's generic `JWT` machinery. Tokens are identical either way. Other algorithms use jwcrypto
+    'COMPACT_TOKEN_CODEC': True,
+    # if True, the signed token is compressed(JWE 'zip': 'DEF') before it is encrypted. Shrinks encrypted tokens(and
+    # Authorization headers) carrying 'full' payloads. Compressed tokens are accepted either way. See the sizes
+    # reported by `python manage.py xauth_benchmark`
+    'COMPRESS_ENCRYPTED_TOKEN': False,
+    # tokens are signed & encrypted by a local signing service(`python manage.py xauth_signing_service`) listening on
+    # the Unix domain socket 'SOCKET' instead of by the web workers, which then verify tokens with the public signing
+    # keys and never load the private signing keys unless falling back. Requests to the service time out after
+    # 'TIMEOUT' seconds. If 'FALLBACK' is True, tokens are issued locally while the service is unreachable, busy or
+    # failing. None issues tokens locally e.g.
+    # {'SOCKET': '/run/xauth/signing.sock', 'TIMEOUT': 5, 'FALLBACK': True, }
+    'SIGNING_SERVICE': None,
     # string. Email addresses to which account / auth-related replies are to be sent.
     # Also permitted: "Name <email-address>"
     'REPLY_TO_ACCOUNTS_EMAIL_ADDRESSES': [
@@ -151,6 +177,15 @@ XAUTH = {
     # period within which a user is considered new since account creation date
     'NEWBIE_VALIDITY_PERIOD': timedelta(days=1),
     'AUTO_HASH_PASSWORD_ON_SAVE': True,
+    # passwords, verification codes, temporary passwords & security answers are hashed(and verified) on a pool of at
+    # most 'MAX_WORKERS' threads with up to 'MAX_QUEUE' more hashes waiting. Requests needing a hash beyond that fail
+    # fast with a 503 and a `Retry-After: RETRY_AFTER` header, keeping the rest of the API responsive during
+    # sign-in bursts. None hashes on the request thread
+    'PASSWORD_HASHING': None,
+    # 'TIME_COST', 'MEMORY_COST'(KiB) & 'PARALLELISM' of `xauth.hashers.CalibratedArgon2PasswordHasher`. Run
+    # `manage.py xauth_calibrate_hasher` on the target hardware to pick them. Stored hashes with other parameters are
+    # upgraded on the next successful sign-in. None uses Django's `Argon2PasswordHasher` parameters
+    'ARGON2_PARAMETERS': None,
     'WRAP_DRF_RESPONSE': True,
     'REQUEST_TOKEN_ENCRYPTED': True,
     'POST_REQUEST_USERNAME_FIELD': 'username',
@@ -163,7 +198,59 @@ XAUTH = {
     'PASSWORD_RESET_ENDPOINT': 'password-reset/verify/',
     'ACTIVATION_ENDPOINT': 'activation/activate/',
     # 0 = both(encrypted&non-encrypted),1 = encrypted only, 2 = non-encrypted only
-    'RETURN_TOKEN_TYPE': 0,  # TODO: Use
+    # token types that are computed and returned to clients
+    'RETURN_TOKEN_TYPE': 0,
+    # cache of verified token claims. Repeat requests with the same token skip decryption & signature verification.
+    # 'BACKEND' is either 'local'(per-process LRU bounded by 'MAX_SIZE') or 'django'(uses `CACHES['CACHE_ALIAS']`).
+    # Entries live for at most 'TIMEOUT' seconds and never past the token's expiry. None disables the cache
+    'VERIFIED_CLAIMS_CACHE': {
+        'BACKEND': 'local',
+        'MAX_SIZE': 10000,
+        'TIMEOUT': 300,
+    },
+    # cache of successful username & password verifications(Basic & POST request authentication) keyed by an HMAC
+    # of the credentials and the user's current password hash. Repeat requests with the same credentials skip the
+    # (deliberately costly) password hasher for up to 'TIMEOUT' seconds while wrong passwords are always hashed.
+    # Changing the password invalidates its entries. Takes the same options as 'VERIFIED_CLAIMS_CACHE'. None disables
+    # the cache
+    'VERIFIED_CREDENTIALS_CACHE': None,
+    # reuse previously issued tokens(e.g. on repeated sign-ins) until 'REISSUE_AFTER'(a fraction of the token's
+    # validity period) has elapsed. Tokens are reissued as soon as any of the token's payload fields change.
+    # Takes the same cache options as 'VERIFIED_CLAIMS_CACHE'. None disables token reuse
+    'TOKEN_REUSE': None,
+    # cache of users fetched during token authentication. Takes the same options as 'VERIFIED_CLAIMS_CACHE'.
+    # Cached users are invalidated(through `CACHES['CACHE_ALIAS']`) whenever a user is saved or deleted. Use a cache
+    # shared by all worker processes(e.g. memcached, redis) for the invalidation to reach every worker.
+    # None disables the cache
+    'USER_CACHE': None,
+    # if True, token-authenticated requests get a user that serves attributes found in the token's payload(e.g.
+    # id, is_active, is_superuser) without querying the database and is only fetched once any other attribute is
+    # accessed. Works best with 'TOKEN_PAYLOAD': 'compact'. N/B: payload values are only as fresh as the token
+    'LAZY_TOKEN_USER': False,
+    # if True, signing & encryption keys(generated if missing) and the password hasher are loaded and validated when
+    # the app is ready i.e. before a server(e.g. `gunicorn --preload`) forks its workers. See also `xauth_warmup`
+    'PRELOAD_KEYS': False,
+    # signing & encryption keys are rotated yearly. Issued tokens carry the id(`kid`) of their keys and are accepted
+    # until their keys are older than 'RETAIN_PERIODS' years. Next year's keys are generated 'PREGENERATE_DAYS'
+    # days before it starts
+    'KEY_ROTATION': {
+        'RETAIN_PERIODS': 1,
+        'PREGENERATE_DAYS': 30,
+    },
+    # number of seconds clients may cache the public keys published at `.well-known/jwks.json` for. Should be less
+    # than KEY_ROTATION's 'PREGENERATE_DAYS' for next year's keys to be picked up before they are used
+    'JWKS_MAX_AGE': 86400,
+    # either 'jwt'(signed & encrypted tokens) or 'reference'(opaque tokens referring to claims kept server-side in
+    # `CACHES['REFERENCE_TOKEN_CACHE_ALIAS']` and the database). Reference tokens are verified with a single lookup
+    # and are revoked on sign out but cannot be verified by other services
+    'TOKEN_FORMAT': 'jwt',
+    'REFERENCE_TOKEN_CACHE_ALIAS': 'default',
+    # tokens revoked(e.g. on sign out) before they expire are rejected. Revocations are checked against an in-memory
+    # bloom filter(sized for 'CAPACITY' revocations with a false positive rate of 'ERROR_RATE') and only looked up in
+    # the database when the filter reports a possible match. Revocations by other worker processes are picked up
+    # within 'SYNC_INTERVAL' seconds. None or an empty dict disables revocation e.g.
+    # {'CAPACITY': 100000, 'ERROR_RATE': 0.001, 'SYNC_INTERVAL': 10, 'REBUILD_INTERVAL': 3600, }
+    'TOKEN_REVOCATION': None,
 }
 
 CELERY_BROKER_URL = 'pyamqp://guest@localhost//'
@@ -7,3 +7,21 @@ class XauthConfig(AppConfig):
     # noinspection PyUnresolvedReferences
     def ready(self):
         from xauth import signals
+        from xauth.utils.settings import XAUTH
+        if XAUTH.get('PRELOAD_KEYS', False):
+            self.preload()
+
+    @staticmethod
+    def preload():
+        """
+        Loads and validates the configured signing & encryption keys and the password hasher's library so that
+        the first request served by every worker process(e.g. when a server imports the app before forking its
+        workers) doesn't pay for them
+        """
+        from django.contrib.auth.hashers import get_hasher
+        from xauth.utils.token import Token
+
+        Token(None).preload()
+        hasher = get_hasher()
+        if hasher.library:
+            hasher._load_library()
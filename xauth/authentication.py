@@ -1,12 +1,19 @@
 import base64
+import hashlib
 import re
+import time
 
 from django.contrib.auth import get_user_model
+from django.utils.crypto import salted_hmac
 from jwcrypto import jwt, jwe
 from rest_framework import authentication as drf_auth, exceptions as drf_exception
 
-from xauth.utils import valid_str, settings
+from xauth.utils import valid_str, settings, revocation
+from xauth.utils.cache import get_cache
+from xauth.utils.lazy_user import LazyTokenUser
+from xauth.utils.reference_token import ReferenceToken
 from xauth.utils.token import Token
+from xauth.utils.user_cache import user_cache
 
 verification_ep = str(settings.XAUTH.get('ACTIVATION_ENDPOINT', 'activation/activate/'))
 password_reset_ep = str(settings.XAUTH.get('PASSWORD_RESET_ENDPOINT', 'password-reset/verify/'))
@@ -19,6 +26,20 @@ class BasicTokenAuthentication(drf_auth.BaseAuthentication):
      before surrendering control to its succeeding Authentication backends
     """
     auth_scheme = 'Bearer'
+    # verified token claims keyed by a digest of the raw token. Saves repeat requests with the same token from
+    # decrypting and verifying it again. None if disabled(the default)
+    claims_cache_config = settings.XAUTH.get('VERIFIED_CLAIMS_CACHE', None)
+    claims_cache = get_cache(claims_cache_config, prefix='xauth:claims')
+    # users fetched by primary key after token verification. None if disabled
+    user_cache = user_cache
+    # if True, token authentication returns a `LazyTokenUser` that's only fetched from the database once an
+    # attribute that's not part of the token's payload is accessed
+    lazy_token_user = settings.XAUTH.get('LAZY_TOKEN_USER', False)
+    # successful username & password verifications(Basic & POST request authentication) keyed by an HMAC of the
+    # credentials and the user's current password hash. Repeat requests with the same credentials skip the password
+    # hasher. None if disabled
+    credentials_cache_config = settings.XAUTH.get('VERIFIED_CREDENTIALS_CACHE', None)
+    credentials_cache = get_cache(credentials_cache_config, prefix='xauth:credentials')
 
     def authenticate(self, request):
         address_header_payload = request.META.get('HTTP_X_Forwarded_For', request.META.get('REMOTE_ADDR', None))
@@ -59,8 +80,10 @@ class BasicTokenAuthentication(drf_auth.BaseAuthentication):
         """
         self.auth_scheme = 'Bearer'
         try:
-            tk = Token(None)
-            claims = tk.get_claims(token=token)
+            tk = ReferenceToken(None) if ReferenceToken.is_reference_token(token) else Token(None)
+            claims = self.get_verified_claims(token, tk)
+            if revocation.revocation_list is not None and revocation.revocation_list.is_revoked(claims.get('jti')):
+                raise jwe.JWException('revoked token')
             user_payload = claims.get(tk.payload_key, {})
             user_id = user_payload.get('id', None) if isinstance(user_payload, dict) else user_payload
             subject = claims.get('sub', 'res-man')
@@ -71,8 +94,10 @@ class BasicTokenAuthentication(drf_auth.BaseAuthentication):
             elif password_reset_ep in request_url and subject != 'password-reset':
                 raise jwe.JWException(f'tokens subject is restricted to {subject}')
             else:
+                if user_id and self.lazy_token_user and isinstance(user_payload, dict):
+                    return LazyTokenUser(user_payload, loader=self.get_lazy_token_user)
                 try:
-                    return get_user_model().objects.get(pk=user_id) if user_id else None
+                    return self.get_user_by_id(user_id) if user_id else None
                 except get_user_model().DoesNotExist as ex:
                     raise drf_exception.AuthenticationFailed(f'user not found#{ex.args[0]}')
         except jwt.JWTExpired as ex:
@@ -82,6 +107,54 @@ class BasicTokenAuthentication(drf_auth.BaseAuthentication):
         except jwe.JWException as ex:
             raise drf_exception.AuthenticationFailed(f'invalid token#{ex.args[0]}')
 
+    def get_user_by_id(self, user_id):
+        """
+        :raises DoesNotExist if user was not found
+        :return: user with primary key `user_id` from `user_cache`(if enabled) or the database
+        """
+        if self.user_cache is None:
+            return get_user_model().objects.get(pk=user_id)
+        return self.user_cache.get(user_id)
+
+    def get_lazy_token_user(self, user_id):
+        """
+        Loads the user behind a `LazyTokenUser`
+
+        :raises AuthenticationFailed if user was not found
+        """
+        try:
+            return self.get_user_by_id(user_id)
+        except get_user_model().DoesNotExist as ex:
+            raise drf_exception.AuthenticationFailed(f'user not found#{ex.args[0]}')
+
+    def get_verified_claims(self, token, tk: Token = None) -> dict:
+        """
+        Gets and returns `token`'s claims from `claims_cache` or by decrypting and verifying `token` if they
+        are not cached. Freshly verified claims are cached for at most `TIMEOUT` seconds and never beyond
+        the token's expiry(`exp`) date
+
+        :raises jwcrypto.jwt.JWTExpired, jwcrypto.jwt.JWTNotYetValid, jwcrypto.jwe.JWException
+        :param token: JWT token
+        :param tk: `Token` used to verify `token`
+        :return: dict of claims
+        """
+        tk = Token(None) if tk is None else tk
+        cache = self.claims_cache
+        if cache is None or isinstance(tk, ReferenceToken):
+            # reference tokens are verified with a single lookup and are never cached to make revocation immediate
+            return tk.get_claims(token=token)
+        token = token.decode() if isinstance(token, bytes) else token
+        key = hashlib.sha256(token.encode()).hexdigest()
+        claims = cache.get(key)
+        if claims is None:
+            claims = tk.get_claims(token=token)
+            timeout = self.claims_cache_config.get('TIMEOUT', 300)
+            expiry = claims.get('exp', None)
+            if isinstance(expiry, (int, float)):
+                timeout = min(timeout, expiry - time.time())
+            cache.set(key, claims, timeout)
+        return claims
+
     def get_user_from_basic_or_token_auth_scheme(self, auth_scheme_and_credentials, request_url):
         """
         Gets and returns a `user` object from a [Bearer|Token] or Basic authentication schemes
@@ -124,7 +197,7 @@ class BasicTokenAuthentication(drf_auth.BaseAuthentication):
         try:
             if valid_str(username) and valid_str(password):
                 user = get_user_model().objects.get_by_natural_key(username)
-                if user.check_password(raw_password=password) is False:
+                if not self.check_user_password(user, username, password):
                     # user was found but password does not match
                     # log user's failed sign-in attempt
                     password_change_message = user.get_last_password_change_message(locale='en')
@@ -139,6 +212,30 @@ class BasicTokenAuthentication(drf_auth.BaseAuthentication):
         user.update_signin_attempts(failed=False, )
         return user
 
+    def check_user_password(self, user, username, password) -> bool:
+        """
+        Checks `password` against `user`'s password with the password hasher unless the same credentials were
+        verified within `credentials_cache`'s 'TIMEOUT'. Only successful verifications are cached. Cached
+        verifications stop matching as soon as the user's password(hash) changes
+
+        :return: True if `password` is `user`'s password
+        """
+        cache = self.credentials_cache
+        if cache is None:
+            return user.check_password(raw_password=password)
+        # keyed with the SECRET_KEY so that cache entries cannot be used to guess passwords
+        key = salted_hmac('xauth.authentication.credentials', '\0'.join([username, password, user.password or '']),
+                          algorithm='sha256').hexdigest()
+        if cache.get(key):
+            return True
+        password_hash = user.password
+        if not user.check_password(raw_password=password):
+            return False
+        if user.password == password_hash:
+            # the password was not rehashed(e.g. with stronger hasher parameters) while checking it
+            cache.set(key, True, self.credentials_cache_config.get('TIMEOUT', 60))
+        return True
+
     @staticmethod
     def get_basic_auth_username_and_password(credentials):
         """
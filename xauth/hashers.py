@@ -0,0 +1,18 @@
+from django.contrib.auth.hashers import Argon2PasswordHasher
+
+from xauth.utils.settings import XAUTH
+
+# see XAUTH['ARGON2_PARAMETERS']. Parameters that are not configured default to Django's
+ARGON2_PARAMETERS = XAUTH.get('ARGON2_PARAMETERS') or {}
+
+
+class CalibratedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    `Argon2PasswordHasher` whose time cost, memory cost(KiB) & parallelism are read from XAUTH['ARGON2_PARAMETERS']
+    instead of being fixed, so they can be tuned(see `manage.py xauth_calibrate_hasher`) for the hardware each fleet
+    runs on. Its algorithm is still 'argon2' i.e. it reads hashes of `Argon2PasswordHasher` and, when listed first
+    in `PASSWORD_HASHERS`, hashes made with other parameters are upgraded on the next successful sign-in
+    """
+    time_cost = ARGON2_PARAMETERS.get('TIME_COST', Argon2PasswordHasher.time_cost)
+    memory_cost = ARGON2_PARAMETERS.get('MEMORY_COST', Argon2PasswordHasher.memory_cost)
+    parallelism = ARGON2_PARAMETERS.get('PARALLELISM', Argon2PasswordHasher.parallelism)
@@ -0,0 +1,84 @@
+import shutil
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from xauth.utils.keyring import KeyRing
+from xauth.utils.token import Token
+
+# resembles `User.token_payload()` of a typical user
+SAMPLE_PAYLOAD = {
+    'username': 'john.doe',
+    'email': 'john.doe@mail-domain.com',
+    'provider': 'EMAIL',
+    'surname': 'Doe',
+    'first_name': 'John',
+    'last_name': 'Smith',
+    'mobile_number': '+254712345678',
+    'date_of_birth': '1990-01-01',
+    'id': 1024,
+    'is_superuser': False,
+    'is_staff': False,
+    'is_verified': True,
+}
+
+
+class Command(BaseCommand):
+    help = 'Compares the cost of signing & verifying tokens and the size of tokens produced by each of the ' \
+           'supported signing algorithms and the size of encrypted tokens with and without compression. Keys are ' \
+           'generated in a temporary directory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100, help='number of tokens signed per algorithm')
+        parser.add_argument('--algorithms', nargs='+', default=Token.ALLOWED_SIGNING_ALGORITHMS,
+                            choices=Token.ALLOWED_SIGNING_ALGORITHMS, help='signing algorithms to benchmark')
+
+    def handle(self, *args, **options):
+        iterations = max(1, options['iterations'])
+        keys_root_path = tempfile.mkdtemp()
+        try:
+            token_class = type('BenchmarkToken', (Token,), {'KEYS_ROOT_PATH': keys_root_path, 'key_ring': KeyRing()})
+            self.stdout.write(f"{'algorithm':<10}{'sign(ms)':>12}{'verify(ms)':>12}{'sign/s':>10}{'size(B)':>10}")
+            for algorithm in options['algorithms']:
+                sign, verify, size = self.benchmark_signing(token_class, algorithm, iterations)
+                self.stdout.write(f'{algorithm:<10}{sign * 1000:>12.3f}{verify * 1000:>12.3f}'
+                                  f'{1 / sign if sign else 0:>10.0f}{size:>10}')
+            self.stdout.write('')
+            self.stdout.write(f"{'payload':<10}{'normal(B)':>12}{'encrypted(B)':>14}{'zip=DEF(B)':>12}{'saved':>8}")
+            user = get_user_model()(**SAMPLE_PAYLOAD)
+            for name, compact in (('compact', True,), ('full', False,),):
+                normal, encrypted, compressed = self.benchmark_sizes(token_class, user.token_payload(compact))
+                self.stdout.write(f'{name:<10}{normal:>12}{encrypted:>14}{compressed:>12}'
+                                  f'{1 - compressed / encrypted:>8.1%}')
+        finally:
+            shutil.rmtree(keys_root_path, ignore_errors=True)
+
+    @staticmethod
+    def benchmark_signing(token_class, algorithm, iterations):
+        """
+        :return: tuple of (mean signing time, mean verification time, token size). Times are in seconds
+        """
+        token = token_class(SAMPLE_PAYLOAD, signing_algorithm=algorithm)
+        # load(or generate) keys before timing
+        token.normal
+        sign_time, verify_time = 0, 0
+        for _ in range(iterations):
+            token = token_class(SAMPLE_PAYLOAD, signing_algorithm=algorithm)
+            start = time.perf_counter()
+            normal = token.normal
+            sign_time += time.perf_counter() - start
+            start = time.perf_counter()
+            token.get_claims(normal, encrypted=False)
+            verify_time += time.perf_counter() - start
+        return sign_time / iterations, verify_time / iterations, len(token.normal)
+
+    @staticmethod
+    def benchmark_sizes(token_class, payload):
+        """
+        :return: tuple of sizes(in bytes) of the normal, encrypted and compressed & encrypted tokens of `payload`
+        """
+        token = token_class(payload)
+        compressed_token = type(token_class.__name__, (token_class,), {'COMPRESS_ENCRYPTED_TOKEN': True, })(payload)
+        return len(token.normal), len(token.encrypted), len(compressed_token.encrypted)
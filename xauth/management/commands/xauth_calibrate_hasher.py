@@ -0,0 +1,83 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from xauth.hashers import CalibratedArgon2PasswordHasher
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks Argon2 time & memory costs on this machine and prints the strongest parameters that hash a ' \
+           "password within --target-ms as XAUTH['ARGON2_PARAMETERS'] of `xauth.hashers.CalibratedArgon2PasswordHasher`"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=250,
+                            help='latency budget(milliseconds) of a single password hash')
+        parser.add_argument('--min-memory', type=int, default=16 * 1024, help='smallest memory cost(KiB) tried')
+        parser.add_argument('--max-memory', type=int, default=256 * 1024,
+                            help='largest memory cost(KiB) tried. Memory costs are doubled from --min-memory')
+        parser.add_argument('--max-time-cost', type=int, default=10, help='largest time cost(iterations) tried')
+        parser.add_argument('--parallelism', type=int, default=CalibratedArgon2PasswordHasher.parallelism,
+                            help='number of lanes(threads) per hash')
+        parser.add_argument('--samples', type=int, default=3,
+                            help='hashes per measurement. The median time is used')
+
+    def handle(self, *args, **options):
+        target, parallelism = options['target_ms'] / 1000, max(1, options['parallelism'])
+        samples, max_time_cost = max(1, options['samples']), max(1, options['max_time_cost'])
+        memory_cost = max(options['min_memory'], 8 * parallelism)  # Argon2's minimum
+        if options['max_memory'] < memory_cost:
+            raise CommandError(f'--max-memory must be at least {memory_cost} KiB')
+
+        self.stdout.write(f"{'memory(KiB)':>12}{'time cost':>11}{'hash(ms)':>10}")
+        results = []
+        while memory_cost <= options['max_memory']:
+            elapsed = self.measure(1, memory_cost, parallelism, samples)
+            if elapsed > target:
+                break
+            # hashing time grows linearly with the time cost
+            time_cost = min(max_time_cost, max(1, int(target / elapsed)))
+            if time_cost > 1:
+                elapsed = self.measure(time_cost, memory_cost, parallelism, samples)
+                while time_cost > 1 and elapsed > target:
+                    time_cost -= 1
+                    elapsed = self.measure(time_cost, memory_cost, parallelism, samples)
+            self.stdout.write(f'{memory_cost:>12}{time_cost:>11}{elapsed * 1000:>10.1f}')
+            results.append((time_cost, memory_cost,))
+            memory_cost *= 2
+        if not results:
+            raise CommandError(f"no parameters hash within {options['target_ms']}ms. Raise --target-ms or lower "
+                               f"--min-memory")
+
+        # hardness is the memory filled times the passes over it. Ties go to the memory harder one
+        time_cost, memory_cost = max(results, key=lambda result: (result[0] * result[1], result[1],))
+        hashers = [h for h in settings.PASSWORD_HASHERS if h != 'xauth.hashers.CalibratedArgon2PasswordHasher']
+        self.stdout.write('')
+        self.stdout.write('PASSWORD_HASHERS = [')
+        for hasher in ['xauth.hashers.CalibratedArgon2PasswordHasher'] + hashers:
+            self.stdout.write(f"    '{hasher}',")
+        self.stdout.write(']')
+        self.stdout.write('XAUTH = {')
+        self.stdout.write('    # ...')
+        self.stdout.write(f"    'ARGON2_PARAMETERS': {{'TIME_COST': {time_cost}, 'MEMORY_COST': {memory_cost}, "
+                          f"'PARALLELISM': {parallelism}, }},")
+        self.stdout.write('}')
+
+    @staticmethod
+    def measure(time_cost, memory_cost, parallelism, samples):
+        """
+        :return: median time(in seconds) `CalibratedArgon2PasswordHasher` takes to hash a password with the parameters
+        """
+        hasher = type('Argon2PasswordHasher', (CalibratedArgon2PasswordHasher,), {
+            'time_cost': time_cost,
+            'memory_cost': memory_cost,
+            'parallelism': parallelism,
+        })()
+        times = []
+        for _ in range(samples):
+            salt = hasher.salt()
+            start = time.perf_counter()
+            hasher.encode('calibration-password', salt)
+            times.append(time.perf_counter() - start)
+        return statistics.median(times)
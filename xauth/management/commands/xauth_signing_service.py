@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from xauth.utils.signing_service import SigningService
+from xauth.utils.token import Token
+
+
+class Command(BaseCommand):
+    help = "Runs the local service that signs & encrypts tokens for web workers over a Unix domain socket. " \
+           "See XAUTH['SIGNING_SERVICE']"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', help="path of the Unix domain socket. Defaults to XAUTH['SIGNING_SERVICE']"
+                                             "['SOCKET']")
+        parser.add_argument('--workers', type=int, default=4, help='number of threads issuing tokens')
+        parser.add_argument('--max-queue', type=int, default=256,
+                            help='maximum number of requests waiting for a free worker. Requests beyond it are '
+                                 'rejected(and issued by the clients if falling back is allowed)')
+
+    def handle(self, *args, **options):
+        path = options['socket'] or (settings.XAUTH.get('SIGNING_SERVICE') or {}).get('SOCKET')
+        if not path:
+            raise CommandError("provide --socket or configure XAUTH['SIGNING_SERVICE']['SOCKET']")
+        # keys are loaded(and validated) before the first request
+        Token(None).preload()
+        self.stdout.write(f'issuing tokens on {path}')
+        try:
+            SigningService(path, workers=options['workers'], max_queue=options['max_queue']).serve_forever()
+        except KeyboardInterrupt:
+            pass
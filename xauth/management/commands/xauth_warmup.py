@@ -0,0 +1,39 @@
+import time
+
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+
+from xauth import serializers
+from xauth.utils.token import Token
+
+
+class Command(BaseCommand):
+    help = 'Loads the signing & encryption keys, the password hasher and the serializers used while serving ' \
+           'requests and reports how long each step took. Missing keys are generated'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'step':<14}{'time(ms)':>10}")
+        for name, step in (('keys', self.warmup_keys), ('hasher', self.warmup_hasher),
+                           ('serializers', self.warmup_serializers),):
+            start = time.perf_counter()
+            step()
+            self.stdout.write(f'{name:<14}{(time.perf_counter() - start) * 1000:>10.3f}')
+
+    @staticmethod
+    def warmup_keys():
+        token = Token({'id': 0}, subject='warmup')
+        token.preload()
+        # exercises signing, encryption and verification code paths
+        token.get_claims(token.encrypted, encrypted=True)
+
+    @staticmethod
+    def warmup_hasher():
+        hasher = get_hasher()
+        hasher.encode('warmup', hasher.salt())
+
+    @staticmethod
+    def warmup_serializers():
+        for serializer_class in (serializers.ProfileSerializer, serializers.AuthTokenOnlySerializer,
+                                 serializers.AuthSerializer, serializers.SignUpSerializer,
+                                 serializers.SecurityQuestionSerializer,):
+            serializer_class().fields
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('xauth', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceTokenRecord',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('claims', models.TextField()),
+                ('exp', models.BigIntegerField(db_index=True, verbose_name='expiry time in seconds since the epoch')),
+            ],
+        ),
+    ]
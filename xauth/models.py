@@ -1,3 +1,4 @@
+import hashlib
 import json
 import re
 from datetime import datetime, timedelta
@@ -9,8 +10,10 @@ from django.utils import timezone
 from django.utils.datetime_safe import date as dj_date
 from django.utils.translation import gettext_lazy as _
 
-from .utils import enums, valid_str, reset_empty_nullable_to_null
+from .utils import enums, hashing, valid_str, reset_empty_nullable_to_null
+from .utils.cache import get_cache
 from .utils.mail import Mail
+from .utils.reference_token import get_token_class
 from .utils.settings import *
 from .utils.token import Token
 
@@ -85,6 +88,13 @@ class User(AbstractBaseUser, PermissionsMixin):
     __ENFORCE_ACCOUNT_VERIFICATION = XAUTH.get('ENFORCE_ACCOUNT_VERIFICATION', True)
     __PROVIDERS = [(k, k) for k, _ in enums.AuthProvider.__members__.items()]
     __DEFAULT_PROVIDER = enums.AuthProvider.EMAIL.name
+    __TOKEN_REUSE = XAUTH.get('TOKEN_REUSE', None)
+    __COMPACT_TOKEN_PAYLOAD = str(XAUTH.get('TOKEN_PAYLOAD', 'full')).lower() == 'compact'
+    # previously issued tokens that are handed out again(instead of issuing new ones) until a fraction
+    # (`TOKEN_REUSE['REISSUE_AFTER']`) of their validity period has elapsed. None if disabled
+    issued_tokens_cache = get_cache(__TOKEN_REUSE, prefix='xauth:issued')
+    # `Token` or `ReferenceToken` depending on `XAUTH['TOKEN_FORMAT']`
+    token_class = get_token_class()
     username = models.CharField(db_index=True, max_length=150, unique=True)
     email = models.EmailField(db_index=True, max_length=150, blank=False, unique=True)
     surname = models.CharField(db_index=True, max_length=50, blank=True, null=True)
@@ -122,6 +132,13 @@ class User(AbstractBaseUser, PermissionsMixin):
     # Contains a tuple of fields that are "safe" to access publicly
     PUBLIC_READ_WRITE_FIELDS = ('username', 'email', 'provider',) + NULLABLE_FIELDS + READ_ONLY_FIELDS
 
+    # Contains a tuple of fields included in compact token payloads. Limited to what's needed to identify
+    # the user and the flags checked during authentication & authorization
+    COMPACT_TOKEN_PAYLOAD_FIELDS = ('id', 'is_active', 'is_verified', 'is_superuser', 'is_staff',)
+
+    # Included in compact token payloads(as `ver`) to allow the payload's format to evolve
+    COMPACT_TOKEN_PAYLOAD_VERSION = 1
+
     class Meta:
         ordering = ('created_at', 'updated_at', 'username',)
 
@@ -232,7 +249,7 @@ class User(AbstractBaseUser, PermissionsMixin):
             return self.activation_token
         expiry = XAUTH.get('TOKEN_EXPIRY', timedelta(days=60))
         requires_verification = not self.is_verified and self.__ENFORCE_ACCOUNT_VERIFICATION
-        return self.verification_token if requires_verification else Token(self.token_payload(), expiry_period=expiry)
+        return self.verification_token if requires_verification else self.__get_memoized_token(expiry=expiry)
 
     @property
     def password_reset_token(self):
@@ -240,7 +257,7 @@ class User(AbstractBaseUser, PermissionsMixin):
         :return: dict of containing pair of encrypted and unencrypted(normal) token for password reset
         """
         expiry = XAUTH.get('TEMPORARY_PASSWORD_EXPIRY', timedelta(minutes=30))
-        return Token(self.token_payload(), expiry_period=expiry, subject='password-reset', )
+        return self.__get_memoized_token(expiry=expiry, subject='password-reset', )
 
     @property
     def verification_token(self):
@@ -249,7 +266,7 @@ class User(AbstractBaseUser, PermissionsMixin):
         verification
         """
         expiry = XAUTH.get('VERIFICATION_CODE_EXPIRY', timedelta(hours=1))
-        return Token(self.token_payload(), expiry_period=expiry, subject='account-verification', )
+        return self.__get_memoized_token(expiry=expiry, subject='account-verification', )
 
     @property
     def activation_token(self):
@@ -258,7 +275,7 @@ class User(AbstractBaseUser, PermissionsMixin):
         activation
         """
         expiry = XAUTH.get('ACCOUNT_ACTIVATION_TOKEN_EXPIRY', timedelta(days=1))
-        return Token(self.token_payload(), expiry_period=expiry, subject='account-activation', )
+        return self.__get_memoized_token(expiry=expiry, subject='account-activation', )
 
     def request_password_reset(self, send_mail: bool = True):
         """
@@ -280,7 +297,8 @@ class User(AbstractBaseUser, PermissionsMixin):
         metadata, _ = Metadata.objects.get_or_create(user_id=self.id)
         metadata.temporary_password = password
         metadata.tp_gen_time = timezone.now()
-        metadata.save()
+        # prevent hashing of other irrelevant table column(s)
+        metadata.save(update_fields=['temporary_password', 'tp_gen_time'])
 
         # create a new password reset log
         self.update_or_create_password_reset_log(force_create=True)
@@ -313,7 +331,8 @@ class User(AbstractBaseUser, PermissionsMixin):
         # store the verification request data to database
         metadata.verification_code = code
         metadata.vc_gen_time = timezone.now()
-        metadata.save()
+        # prevent hashing of other irrelevant table column(s)
+        metadata.save(update_fields=['verification_code', 'vc_gen_time'])
         return self.verification_token, code
 
     def reset_password(self, temporary_password, new_password):
@@ -546,12 +565,39 @@ class User(AbstractBaseUser, PermissionsMixin):
             rand = User.objects.make_random_password(length=length, allowed_chars='23456789')
         return rand
 
-    def token_payload(self) -> dict:
+    def token_payload(self, compact: bool = None) -> dict:
         """
+        :param compact: if True, only `COMPACT_TOKEN_PAYLOAD_FIELDS` are included. Defaults to True if
+        `XAUTH['TOKEN_PAYLOAD']` is 'compact'
         :return: dict of data that is attached to JWT token as payload
         """
+        compact = self.__COMPACT_TOKEN_PAYLOAD if compact is None else compact
+        if compact:
+            payload = {field: getattr(self, field, None) for field in self.COMPACT_TOKEN_PAYLOAD_FIELDS}
+            payload['ver'] = self.COMPACT_TOKEN_PAYLOAD_VERSION
+            return payload
         return {field: getattr(self, field, None) for field in self.PUBLIC_READ_WRITE_FIELDS}
 
+    def set_password(self, raw_password):
+        # hashed on the bounded `hashing.hashing_executor`(if enabled)
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        """
+        :raises xauth.utils.hashing.HashingUnavailable if the `hashing.hashing_executor` is saturated
+        :return: True if `raw_password` is correct. Upgrades the stored hash if the hasher(or its parameters) changed
+        """
+
+        def setter(password):
+            self.set_password(password)
+            # Password hash upgrades shouldn't be considered password changes.
+            self._password = None
+            # already hashed
+            self.save(auto_hash_password=False, update_fields=['password'])
+
+        return hashing.check_password(raw_password, self.password, setter)
+
     def _hash_code(self, raw_code):
         """
         Uses `settings.PASSWORD_HASHERS` to create and return a hashed `code` just like creating a hashed
@@ -569,6 +615,63 @@ class User(AbstractBaseUser, PermissionsMixin):
         self.password = acc_password
         return code
 
+    def __get_memoized_token(self, expiry: timedelta, subject: str = None) -> Token:
+        """
+        Gets and returns a `Token` issued earlier(e.g. during the same request) from this user instance or
+        creates(and memoizes) a new one. A memoized token is only reused as long as it has not expired and
+        the token's subject, expiry period and payload are unchanged so that one response(whose serializer
+        accesses the token more than once) signs and encrypts exactly one token
+
+        :param expiry: token's expiry period
+        :param subject: token's subject
+        """
+        payload = self.token_payload()
+        fingerprint = (expiry, json.dumps(payload, sort_keys=True, default=str),)
+        tokens = self.__dict__.setdefault('_issued_tokens', {})
+        memoized = tokens.get(subject)
+        if memoized is not None:
+            _fingerprint, token = memoized
+            token_expiry = token.activation_date + token.expiry_period if token.activation_date else None
+            if _fingerprint == fingerprint and (token_expiry is None or token_expiry > datetime.now()):
+                return token
+        token = self.__get_reusable_token(payload, fingerprint, expiry, subject)
+        tokens[subject] = (fingerprint, token)
+        return token
+
+    def __get_reusable_token(self, payload, fingerprint, expiry: timedelta, subject: str = None) -> Token:
+        """
+        Gets and returns a previously issued token from `issued_tokens_cache` or a new `Token` that's added to the
+        cache once issued. A cached token is keyed by (user id, subject, payload fingerprint) and is therefore not
+        reused once any of the token's payload fields change
+        """
+        cache = self.issued_tokens_cache
+        if cache is None or self.pk is None:
+            return self.token_class(payload, expiry_period=expiry, subject=subject, )
+        digest = hashlib.sha256(repr(fingerprint).encode()).hexdigest()
+        key = f'{self.pk}:{subject}:{digest}'
+        reissue_after = expiry * (self.__TOKEN_REUSE or {}).get('REISSUE_AFTER', 0.5)
+
+        def on_issue(t: Token):
+            # reuse the token until `reissue_after` has elapsed since it became valid
+            timeout = (t.activation_date + reissue_after - datetime.now()).total_seconds()
+            cache.set(key, {
+                'normal': t._normal,
+                'encrypted': t._encrypted,
+                'nbf': t.activation_date.timestamp(),
+            }, timeout)
+
+        issued = cache.get(key)
+        if issued and self.token_class.is_revoked(issued['normal']):
+            # e.g. on sign out
+            cache.delete(key)
+            issued = None
+        activation_date = datetime.fromtimestamp(issued['nbf']) if issued else None
+        token = self.token_class(payload, activation_date=activation_date, expiry_period=expiry, subject=subject,
+                                 on_issue=on_issue, )
+        if issued:
+            token._normal, token._encrypted = issued['normal'], issued['encrypted']
+        return token
+
     def __reinitialize_password_with_hash(self):
         _password = self.password
         if valid_str(_password):
@@ -617,9 +720,11 @@ class Metadata(models.Model):
     """
     Contains additional data used for user account 'house-keeping'
 
-    :cvar temporary_password hashed short-live password expected to be used for password reset
+    :cvar temporary_password hashed(see `hashing.make_code`) short-live password expected to be used for password
+    reset
 
-    :cvar verification_code hashed short-live code expected to be used for account verification
+    :cvar verification_code hashed(see `hashing.make_code`) short-live code expected to be used for account
+    verification
     """
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, )
     security_question = models.ForeignKey(SecurityQuestion, on_delete=models.SET_DEFAULT,
@@ -631,15 +736,35 @@ class Metadata(models.Model):
     vc_gen_time = models.DateTimeField(_('verification code generation time'), blank=True, null=True)
     deactivation_time = models.DateTimeField(_("user account's deactivation time"), blank=True, null=True)
 
+    # hashed columns. Stored(hashed) values are tracked so that only newly assigned raw values are hashed on save
+    HASHED_FIELDS = ('security_question_answer', 'verification_code', 'temporary_password',)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Metadata, cls).from_db(db, field_names, values)
+        instance.__track_hashed_fields(cls.HASHED_FIELDS)
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super(Metadata, self).refresh_from_db(using=using, fields=fields)
+        self.__track_hashed_fields(self.HASHED_FIELDS if fields is None else fields)
+
     def save(self, *args, **kwargs):
-        raw_code = self.verification_code
-        raw_password = self.temporary_password
-        if valid_str(raw_code):
-            self.verification_code = self._hash_code(raw_code)
-        if valid_str(raw_password):
-            self.temporary_password = self._hash_code(raw_password)
-        self.__reinitialize_security_answer()
+        """
+        Hashes the security question answer, verification code and temporary password only if they were assigned
+        new(raw) values since they were last loaded or saved. `update_fields` saves only hash the fields they update
+        """
+        update_fields = kwargs.get('update_fields')
+        fields = self.HASHED_FIELDS if update_fields is None else set(self.HASHED_FIELDS).intersection(update_fields)
+        changed_fields = self.__get_changed_fields(fields)
+        if 'verification_code' in changed_fields and valid_str(self.verification_code):
+            self.verification_code = hashing.make_code(self.verification_code)
+        if 'temporary_password' in changed_fields and valid_str(self.temporary_password):
+            self.temporary_password = hashing.make_code(self.temporary_password)
+        if 'security_question_answer' in changed_fields:
+            self.__reinitialize_security_answer()
         super(Metadata, self).save(*args, **kwargs)
+        self.__track_hashed_fields(fields)
 
     def __str__(self):
         return f'{self.security_question}'
@@ -656,11 +781,11 @@ class Metadata(models.Model):
 
     def check_temporary_password(self, raw_password) -> bool:
         """:returns True if `raw_password` matches `self.temporary_password`"""
-        return self.__verify_this_against_other_code(self.temporary_password, raw_password)
+        return hashing.check_code(raw_password, self.temporary_password)
 
     def check_verification_code(self, raw_code) -> bool:
         """:returns True if `raw_code` matches `self.verification_code`"""
-        return self.__verify_this_against_other_code(self.verification_code, raw_code)
+        return hashing.check_code(raw_code, self.verification_code)
 
     def check_security_question_answer(self, raw_answer) -> bool:
         """:returns True if `raw_answer` matches `self.security_question_answer`"""
@@ -681,27 +806,34 @@ class Metadata(models.Model):
     def _hash_code(self, raw_code):
         return self.user._hash_code(raw_code)
 
-    # noinspection PyUnresolvedReferences
-    def __verify_this_against_other_code(self, this, other):
-        user = self.user
-        user.password = this
-        return user.check_password(other)
+    @staticmethod
+    def __verify_this_against_other_code(this, other):
+        # `this` is never rehashed since it is not the user's password
+        return hashing.check_password(other, this)
+
+    def __track_hashed_fields(self, fields):
+        stored_values = self.__dict__.setdefault('_stored_hashed_values', {})
+        for field in set(self.HASHED_FIELDS).intersection(fields):
+            if field in self.__dict__:
+                stored_values[field] = self.__dict__[field]
+
+    def __get_changed_fields(self, fields):
+        """
+        :return: names of `fields` that were assigned since they were last loaded or saved. Deferred fields that
+        were never loaded are unchanged
+        """
+        stored_values = self.__dict__.get('_stored_hashed_values', {})
+        return {field for field in fields if field in self.__dict__ and (
+                field not in stored_values or stored_values[field] != self.__dict__[field])}
 
-    # noinspection PyUnresolvedReferences
     def __reinitialize_security_answer(self):
-        hashed_answer = self._hash_code(self.security_question_answer)
-        meta = self.user.metadata
-        if meta.security_question.usable:
+        if self.security_question.usable:
             # providing an answer only makes sense if the question being answered
             # is ready to receive answers
-            if meta.security_question_answer != hashed_answer:
-                # answer was changed. Update
-                self.security_question_answer = hashed_answer
-        else:
-            # question is unusable
-            if not valid_str(self.security_question_answer):
-                # set an un-usable password for an unusable account
-                self.security_question_answer = hashed_answer
+            self.security_question_answer = self._hash_code(self.security_question_answer)
+        elif not valid_str(self.security_question_answer):
+            # set an un-usable password for an unusable account
+            self.security_question_answer = self._hash_code(None)
 
 
 class AccessLog(models.Model):
@@ -766,3 +898,22 @@ class FailedSignInAttempt(models.Model):
                 self.user.save(auto_hash_password=False)
             return rem
         return -1
+
+
+class ReferenceTokenRecord(models.Model):
+    """
+    Server-side record of a `ReferenceToken`. Keyed by a digest of the token so that the token itself is
+    never stored
+    """
+    digest = models.CharField(max_length=64, primary_key=True, )
+    claims = models.TextField()
+    exp = models.BigIntegerField(_('expiry time in seconds since the epoch'), db_index=True, )
+
+
+class RevokedToken(models.Model):
+    """
+    Token revoked(e.g. on sign out) before its expiry. See `RevocationList`
+    """
+    jti = models.CharField(max_length=64, primary_key=True, )
+    exp = models.BigIntegerField(_('expiry time in seconds since the epoch'), db_index=True, )
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True, )
@@ -2,6 +2,7 @@ from django.contrib.auth import get_user_model
 from rest_framework import serializers
 
 from xauth.models import SecurityQuestion
+from xauth.utils.token import Token
 
 
 class ProfileSerializer(serializers.ModelSerializer):
@@ -16,13 +17,22 @@ class ProfileSerializer(serializers.ModelSerializer):
 
 
 class AuthTokenOnlySerializer(serializers.HyperlinkedModelSerializer):
-    normal = serializers.CharField(source='token.tokens.normal', read_only=True, )
-    encrypted = serializers.CharField(source='token.tokens.encrypted', read_only=True, )
+    normal = serializers.CharField(source='token.normal', read_only=True, )
+    encrypted = serializers.CharField(source='token.encrypted', read_only=True, )
 
     class Meta:
         model = get_user_model()
         fields = 'normal', 'encrypted',
 
+    def get_fields(self):
+        fields = super().get_fields()
+        # only include token types configured by `XAUTH['RETURN_TOKEN_TYPE']` to avoid computing the rest
+        returned = Token.get_token_names()
+        for name in AuthTokenOnlySerializer.Meta.fields:
+            if name not in returned:
+                fields.pop(name, None)
+        return fields
+
 
 class AuthSerializer(AuthTokenOnlySerializer):
     url = serializers.HyperlinkedIdentityField(view_name='xauth:profile')
@@ -1,9 +1,10 @@
 from django.contrib.auth import get_user_model
 from django.db import IntegrityError
-from django.db.models.signals import pre_save, post_save, post_migrate
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
 from django.utils import timezone
 
 from xauth.models import AccessLog, SecurityQuestion
+from xauth.utils import user_cache
 
 
 def on_user_pre_save(sender, instance, **kwargs):
@@ -28,6 +29,13 @@ def on_user_post_save(sender, instance, created, **kwargs):
         user.request_verification()
 
 
+def on_user_post_save_or_delete(sender, instance, **kwargs):
+    """invalidates `instance`(user) cached during authentication in all worker processes"""
+    cache = user_cache.user_cache
+    if cache is not None and instance.pk is not None:
+        cache.invalidate(instance.pk)
+
+
 def on_post_migrate(sender, **kwargs):
     try:
         SecurityQuestion.objects.get_or_create(question='Default', usable=False, )
@@ -38,3 +46,5 @@ def on_post_migrate(sender, **kwargs):
 pre_save.connect(on_user_pre_save, sender=get_user_model(), dispatch_uid='1')
 post_save.connect(on_user_post_save, sender=get_user_model(), dispatch_uid='2')
 post_migrate.connect(on_post_migrate, dispatch_uid='3')
+post_save.connect(on_user_post_save_or_delete, sender=get_user_model(), dispatch_uid='4')
+post_delete.connect(on_user_post_save_or_delete, sender=get_user_model(), dispatch_uid='5')
@@ -10,3 +10,21 @@ def send_mail_async(subject: str, body_p: str, body_f: str, recipients: list, se
     mc = EmailMultiAlternatives(subject=subject, body=body_p, from_email=sender, to=recipients, reply_to=reply_to)
     mc.attach_alternative(body_f, "text/html")
     mc.send()
+
+
+@shared_task
+def purge_expired_reference_tokens():
+    """
+    Deletes database records of expired reference tokens. Meant to be scheduled(e.g. daily with celery beat)
+    """
+    from xauth.utils.reference_token import ReferenceToken
+    return ReferenceToken.purge_expired()
+
+
+@shared_task
+def purge_expired_revoked_tokens():
+    """
+    Deletes revocations of expired tokens. Meant to be scheduled(e.g. daily with celery beat)
+    """
+    from xauth.utils.revocation import RevocationList
+    return RevocationList.purge_expired()
@@ -0,0 +1,152 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+
+from xauth import authentication
+from xauth.utils.cache import LocalCache, DjangoCache, get_cache
+from xauth.utils.token import Token
+
+
+class LocalCacheTestCase(APITestCase):
+
+    def test_least_recently_used_entry_is_evicted_when_max_size_is_exceeded(self):
+        cache = LocalCache(max_size=2)
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 60)
+        cache.get('a')
+        cache.set('c', 3, 60)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_expired_entries_are_not_returned(self):
+        cache = LocalCache()
+        with mock.patch('xauth.utils.cache.time.monotonic', return_value=100):
+            cache.set('a', 1, 10)
+        with mock.patch('xauth.utils.cache.time.monotonic', return_value=110):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_entries_with_non_positive_timeout_are_not_cached(self):
+        cache = LocalCache()
+        cache.set('a', 1, 0)
+        cache.set('b', 1, -5)
+        self.assertEqual(len(cache), 0)
+
+    def test_stats_reports_hits_misses_and_hit_rate(self):
+        cache = LocalCache()
+        cache.set('a', 1, 60)
+        cache.get('a')
+        cache.get('a')
+        cache.get('b')
+        self.assertEqual(cache.stats(), {'hits': 2, 'misses': 1, 'hit_rate': 2 / 3, })
+
+
+class GetCacheTestCase(APITestCase):
+
+    def test_get_cache_returns_none_if_caching_is_disabled(self):
+        self.assertIsNone(get_cache(None, prefix='test'))
+        self.assertIsNone(get_cache({}, prefix='test'))
+
+    def test_get_cache_returns_configured_backend(self):
+        self.assertIsInstance(get_cache({'BACKEND': 'local', }, prefix='test'), LocalCache)
+        self.assertIsInstance(get_cache({'BACKEND': 'django', }, prefix='test'), DjangoCache)
+        with self.assertRaises(ValueError):
+            get_cache({'BACKEND': 'redis', }, prefix='test')
+
+    def test_django_cache_stores_entries_in_django_cache(self):
+        from django.core.cache import cache as django_cache
+        cache = DjangoCache(prefix='test')
+        cache.set('a', {'sub': 'res-man'}, 60)
+        self.assertEqual(django_cache.get('test:a'), {'sub': 'res-man'})
+        self.assertEqual(cache.get('a'), {'sub': 'res-man'})
+
+    def test_django_cache_does_not_clear_the_shared_cache(self):
+        from django.core.cache import cache as django_cache
+        django_cache.set('session', 'data', 60)
+        with self.assertRaises(NotImplementedError):
+            DjangoCache(prefix='test').clear()
+        self.assertEqual(django_cache.get('session'), 'data')
+
+
+class VerifiedClaimsCacheTestCase(APITestCase):
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(username='user', email='user@mail-domain.com', )
+        self.backend = authentication.BasicTokenAuthentication()
+        self.backend.claims_cache = LocalCache(prefix='test')
+        self.token = Token(self.user.token_payload()).encrypted
+
+    def test_repeat_requests_with_same_token_skip_token_verification(self):
+        with mock.patch.object(Token, 'get_claims', wraps=Token(None).get_claims) as get_claims:
+            user = self.backend.get_user_from_jwt_token(self.token, 'http://testserver/')
+            user1 = self.backend.get_user_from_jwt_token(self.token, 'http://testserver/')
+        self.assertEqual(get_claims.call_count, 1)
+        self.assertEqual(user, self.user)
+        self.assertEqual(user1, self.user)
+        self.assertEqual(self.backend.claims_cache.stats().get('hits'), 1)
+
+    def test_cached_claims_do_not_outlive_token_expiry(self):
+        token = Token(self.user.token_payload(), expiry_period=timedelta(seconds=30)).encrypted
+        with mock.patch.object(LocalCache, 'set', autospec=True) as cache_set:
+            self.backend.get_verified_claims(token)
+        timeout = cache_set.call_args[0][3]
+        self.assertLessEqual(timeout, 30)
+
+    def test_subject_restrictions_are_enforced_for_cached_claims(self):
+        from rest_framework.exceptions import AuthenticationFailed
+        self.backend.get_user_from_jwt_token(self.token, 'http://testserver/')
+        with self.assertRaises(AuthenticationFailed):
+            self.backend.get_user_from_jwt_token(self.token, f'http://testserver/{authentication.verification_ep}')
+
+    def test_claims_are_verified_every_time_if_cache_is_disabled(self):
+        self.backend.claims_cache = None
+        with mock.patch.object(Token, 'get_claims', wraps=Token(None).get_claims) as get_claims:
+            self.backend.get_user_from_jwt_token(self.token, 'http://testserver/')
+            self.backend.get_user_from_jwt_token(self.token, 'http://testserver/')
+        self.assertEqual(get_claims.call_count, 2)
+
+
+class VerifiedCredentialsCacheTestCase(APITestCase):
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(username='user', email='user@mail-domain.com',
+                                                         password='Pa$$word', )
+        self.backend = authentication.BasicTokenAuthentication()
+        self.backend.credentials_cache = LocalCache(prefix='test')
+        self.backend.credentials_cache_config = {'TIMEOUT': 60, }
+        check_password = get_user_model().check_password
+        patcher = mock.patch.object(get_user_model(), 'check_password', autospec=True, side_effect=check_password)
+        self.check_password = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeat_requests_with_same_credentials_skip_password_hasher(self):
+        for _ in range(3):
+            self.assertEqual(self.backend.get_user_with_username_and_password('user', 'Pa$$word'), self.user)
+        self.assertEqual(self.check_password.call_count, 1)
+
+    def test_wrong_passwords_are_always_hashed(self):
+        from rest_framework.exceptions import AuthenticationFailed
+        self.backend.get_user_with_username_and_password('user', 'Pa$$word')
+        for _ in range(2):
+            with self.assertRaises(AuthenticationFailed):
+                self.backend.get_user_with_username_and_password('user', 'wrong')
+        self.assertEqual(self.check_password.call_count, 3)
+
+    def test_changing_password_invalidates_cached_verifications(self):
+        from rest_framework.exceptions import AuthenticationFailed
+        self.backend.get_user_with_username_and_password('user', 'Pa$$word')
+        user = get_user_model().objects.get(pk=self.user.pk)
+        user.password = 'N3w-Pa$$word'
+        user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.backend.get_user_with_username_and_password('user', 'Pa$$word')
+        self.assertEqual(self.backend.get_user_with_username_and_password('user', 'N3w-Pa$$word'), self.user)
+
+    def test_cache_keys_do_not_reveal_credentials(self):
+        self.backend.get_user_with_username_and_password('user', 'Pa$$word')
+        key, = self.backend.credentials_cache._data.keys()
+        self.assertNotIn('Pa$$word', key)
+        self.assertNotIn(self.user.password, key)
@@ -0,0 +1,137 @@
+import json
+import time
+from unittest import mock
+
+from jwcrypto import jwe, jwk, jws, jwt
+from rest_framework.test import APITestCase
+
+from xauth.utils.codec import CompactTokenCodec
+from xauth.utils.token import Token
+
+
+class CompactTokenCodecTestCase(APITestCase):
+    signing_key = jwk.JWK.generate(kty='RSA', size=2048)
+    encryption_key = jwk.JWK.generate(kty='EC', crv='P-256')
+
+    def setUp(self) -> None:
+        self.codec = CompactTokenCodec()
+        now = int(time.time())
+        self.claims = {'nbf': now, 'exp': now + 60, 'iat': now, 'sub': 'res-man', 'payload': {'id': 1, }, }
+        self.signing_header = {'alg': 'RS256', 'typ': 'JWT', 'kid': self.signing_key.thumbprint(), }
+        self.encryption_header = {'alg': 'ECDH-ES', 'enc': 'A256GCM', 'kid': self.encryption_key.thumbprint(), }
+
+    def jwcrypto_signed_token(self, claims=None):
+        token = jwt.JWT(header=self.signing_header, claims=self.claims if claims is None else claims)
+        token.make_signed_token(self.signing_key)
+        return token.serialize()
+
+    def test_signed_token_is_identical_to_jwcrypto(self):
+        self.assertEqual(self.codec.sign(self.signing_header, self.claims, self.signing_key),
+                         self.jwcrypto_signed_token())
+
+    def test_signed_tokens_are_verified_by_either_implementation(self):
+        token = self.codec.sign(self.signing_header, self.claims, self.signing_key)
+        self.assertEqual(json.loads(jwt.JWT(key=self.signing_key, jwt=token).claims), self.claims)
+        self.assertEqual(self.codec.verify(self.jwcrypto_signed_token(), self.signing_key), self.claims)
+
+    def test_encrypted_tokens_are_decrypted_by_either_implementation(self):
+        normal = self.jwcrypto_signed_token()
+        token = self.codec.encrypt(self.encryption_header, normal, self.encryption_key)
+        self.assertEqual(jwt.JWT(key=self.encryption_key, jwt=token).claims, normal)
+        self.assertEqual({k: v for k, v in Token._get_header(token, ValueError).items() if k != 'epk'},
+                         self.encryption_header)
+
+        e_token = jwt.JWT(header=self.encryption_header, claims=normal)
+        e_token.make_encrypted_token(self.encryption_key)
+        token = e_token.serialize()
+        self.assertEqual(self.codec.decrypt(token, Token._get_header(token, ValueError), self.encryption_key), normal)
+
+    def test_compressed_tokens_are_decrypted_by_either_implementation(self):
+        normal, header = self.jwcrypto_signed_token(), dict(self.encryption_header, zip='DEF')
+        token = self.codec.encrypt(header, normal, self.encryption_key)
+        self.assertEqual(jwt.JWT(key=self.encryption_key, jwt=token).claims, normal)
+        self.assertLess(len(token), len(self.codec.encrypt(self.encryption_header, normal, self.encryption_key)))
+
+        e_token = jwt.JWT(header=header, claims=normal)
+        e_token.make_encrypted_token(self.encryption_key)
+        token = e_token.serialize()
+        self.assertEqual(self.codec.decrypt(token, Token._get_header(token, ValueError), self.encryption_key), normal)
+
+    def test_plaintext_decompressing_beyond_the_limit_is_rejected(self):
+        header = dict(self.encryption_header, zip='DEF')
+        token = self.codec.encrypt(header, 'a' * (CompactTokenCodec.MAX_DECOMPRESSED_SIZE + 1), self.encryption_key)
+        with self.assertRaises(jwe.InvalidJWEData):
+            self.codec.decrypt(token, Token._get_header(token, ValueError), self.encryption_key)
+
+    def test_tampered_signed_token_is_rejected(self):
+        header, payload, signature = self.codec.sign(self.signing_header, self.claims, self.signing_key).split('.')
+        forged = self.codec.sign(self.signing_header, dict(self.claims, payload={'id': 2, }), self.signing_key)
+        with self.assertRaises(jws.InvalidJWSSignature):
+            self.codec.verify(f"{header}.{forged.split('.')[1]}.{signature}", self.signing_key)
+        with self.assertRaises(jws.InvalidJWSObject):
+            self.codec.verify(f'{header}.{payload}', self.signing_key)
+
+    def test_token_encrypted_for_another_key_is_rejected(self):
+        token = self.codec.encrypt(self.encryption_header, 'normal', self.encryption_key)
+        with self.assertRaises(jwe.InvalidJWEData):
+            self.codec.decrypt(token, Token._get_header(token, ValueError), jwk.JWK.generate(kty='EC', crv='P-256'))
+
+    def test_expired_and_not_yet_valid_tokens_are_rejected(self):
+        now = int(time.time())
+        with self.assertRaises(jwt.JWTExpired):
+            self.codec.verify(self.jwcrypto_signed_token(dict(self.claims, exp=now - 120)), self.signing_key)
+        with self.assertRaises(jwt.JWTNotYetValid):
+            self.codec.verify(self.jwcrypto_signed_token(dict(self.claims, nbf=now + 120)), self.signing_key)
+        # within the leeway
+        self.codec.verify(self.jwcrypto_signed_token(dict(self.claims, exp=now - 30)), self.signing_key)
+
+    def test_other_profiles_are_left_to_jwcrypto(self):
+        self.assertTrue(self.codec.can_sign(self.signing_header, self.signing_key))
+        self.assertFalse(self.codec.can_sign(dict(self.signing_header, alg='ES256'), self.signing_key))
+        self.assertFalse(self.codec.can_sign(dict(self.signing_header, crit=['exp']), self.signing_key))
+        self.assertFalse(self.codec.can_sign(self.signing_header, self.encryption_key))
+        self.assertTrue(self.codec.can_encrypt(self.encryption_header, self.encryption_key))
+        self.assertFalse(self.codec.can_encrypt(dict(self.encryption_header, alg='dir'), self.encryption_key))
+        self.assertTrue(self.codec.can_encrypt(dict(self.encryption_header, zip='DEF'), self.encryption_key))
+        self.assertFalse(self.codec.can_encrypt(dict(self.encryption_header, zip='GZIP'), self.encryption_key))
+
+    def test_key_objects_are_reused(self):
+        with mock.patch.object(self.signing_key, 'get_op_key', wraps=self.signing_key.get_op_key) as get_op_key:
+            for _ in range(3):
+                self.codec.sign(self.signing_header, self.claims, self.signing_key)
+            self.assertEqual(get_op_key.call_count, 1)
+
+
+class TokenCodecTestCase(APITestCase):
+
+    def test_tokens_are_interchangeable_with_and_without_the_codec(self):
+        with mock.patch.object(Token, 'codec', None):
+            jwcrypto_token = Token(payload=1)
+            jwcrypto_encrypted = jwcrypto_token.encrypted
+        token = Token(payload=2)
+        self.assertEqual(Token(None).get_payload(jwcrypto_encrypted), 1)
+        self.assertEqual(Token(None).get_payload(jwcrypto_token.normal, encrypted=False), 1)
+        with mock.patch.object(Token, 'codec', None):
+            self.assertEqual(Token(None).get_payload(token.encrypted), 2)
+            self.assertEqual(Token(None).get_payload(token.normal, encrypted=False), 2)
+
+    def test_compressed_encrypted_tokens(self):
+        with mock.patch.object(Token, 'COMPRESS_ENCRYPTED_TOKEN', True):
+            token = Token(payload={'id': 1, 'email': 'john.doe@mail-domain.com', })
+            self.assertEqual(Token._get_header(token.encrypted, ValueError).get('zip'), 'DEF')
+            # compressed tokens are accepted regardless of COMPRESS_ENCRYPTED_TOKEN
+            with mock.patch.object(Token, 'COMPRESS_ENCRYPTED_TOKEN', False):
+                self.assertEqual(Token(None).get_payload(token.encrypted).get('id'), 1)
+            with mock.patch.object(Token, 'codec', None):
+                self.assertEqual(Token(None).get_payload(token.encrypted).get('id'), 1)
+                for algorithm in Token.SYMMETRIC_ENCRYPTION_ALGORITHMS:
+                    token = Token(payload=1, encryption_algorithm=algorithm)
+                    self.assertEqual(Token(None).get_payload(token.encrypted), 1)
+
+    def test_codec_is_used_for_supported_profiles_only(self):
+        codec = CompactTokenCodec()
+        with mock.patch.object(Token, 'codec', codec), mock.patch.object(codec, 'verify', wraps=codec.verify) as verify:
+            self.assertEqual(Token(payload=1).get_payload(), 1)
+            self.assertEqual(verify.call_count, 1)
+            self.assertEqual(Token(payload=1, signing_algorithm='ES256').get_payload(), 1)
+            self.assertEqual(verify.call_count, 1)
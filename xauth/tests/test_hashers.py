@@ -0,0 +1,69 @@
+import base64
+import io
+from unittest import mock
+
+from django.contrib.auth.hashers import Argon2PasswordHasher, get_hasher, identify_hasher
+from django.core.management import call_command, CommandError
+from django.urls import reverse
+from rest_framework import status
+
+from xauth.hashers import CalibratedArgon2PasswordHasher
+from xauth.tests import *
+
+
+class CalibratedArgon2PasswordHasherTestCase(UserAPITestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.user.is_verified = True
+        self.user.save(auto_hash_password=False)
+        credentials = base64.b64encode(f'{self.username}:{self.password}'.encode()).decode()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Basic {credentials}')
+
+    def get_password_parameters(self):
+        encoded = get_user_model().objects.get(pk=self.user.pk).password
+        decoded = identify_hasher(encoded).decode(encoded)
+        return decoded['time_cost'], decoded['memory_cost'], decoded['parallelism']
+
+    def sign_in(self):
+        response = self.client.get(reverse('xauth:profile', kwargs={'pk': self.user.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_is_the_default_hasher(self):
+        self.assertIsInstance(get_hasher(), CalibratedArgon2PasswordHasher)
+        self.assertEqual(self.get_password_parameters(), (CalibratedArgon2PasswordHasher.time_cost,
+                                                          CalibratedArgon2PasswordHasher.memory_cost,
+                                                          CalibratedArgon2PasswordHasher.parallelism,))
+
+    def test_hashes_are_upgraded_to_the_configured_parameters_on_sign_in(self):
+        with mock.patch.multiple(CalibratedArgon2PasswordHasher, time_cost=1, memory_cost=1024, parallelism=1):
+            self.sign_in()
+            self.assertEqual(self.get_password_parameters(), (1, 1024, 1,))
+            with mock.patch.object(get_user_model(), 'save') as save:
+                self.sign_in()
+            # already up to date
+            save.assert_not_called()
+        self.assertTrue(get_user_model().objects.get(pk=self.user.pk).check_password(self.password))
+
+    def test_hashes_of_djangos_argon2_hasher_are_upgraded_on_sign_in(self):
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            password=Argon2PasswordHasher().encode(self.password, Argon2PasswordHasher().salt()))
+        with mock.patch.multiple(CalibratedArgon2PasswordHasher, time_cost=1, memory_cost=1024, parallelism=1):
+            self.sign_in()
+            self.assertEqual(self.get_password_parameters(), (1, 1024, 1,))
+
+
+class CalibrateHasherCommandTestCase(APITestCase):
+
+    def test_strongest_parameters_within_the_target_are_printed(self):
+        out = io.StringIO()
+        call_command('xauth_calibrate_hasher', '--target-ms', '5000', '--min-memory', '1024', '--max-memory', '2048',
+                     '--max-time-cost', '2', '--parallelism', '1', '--samples', '1', stdout=out)
+        output = out.getvalue()
+        self.assertIn("'xauth.hashers.CalibratedArgon2PasswordHasher',", output)
+        self.assertIn("'ARGON2_PARAMETERS': {'TIME_COST': 2, 'MEMORY_COST': 2048, 'PARALLELISM': 1, },", output)
+
+    def test_unreachable_target_is_reported(self):
+        with self.assertRaises(CommandError):
+            call_command('xauth_calibrate_hasher', '--target-ms', '0', '--min-memory', '1024', '--max-memory', '1024',
+                         '--samples', '1', stdout=io.StringIO())
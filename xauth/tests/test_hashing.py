@@ -0,0 +1,126 @@
+import base64
+import threading
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.urls import reverse
+from rest_framework import status
+
+from xauth.tests import *
+from xauth.utils import hashing
+from xauth.utils.hashing import HashingExecutor, HashingUnavailable
+
+
+class HashingExecutorTestCase(APITestCase):
+
+    def test_hashes_are_run_on_the_executor(self):
+        executor = HashingExecutor(max_workers=2, max_queue=0)
+        self.assertTrue(executor.run(threading.current_thread).name.startswith('xauth-hashing'))
+        self.assertEqual(executor.stats(), {'queue_depth': 0, 'running': 0, 'rejected': 0, })
+
+    def test_saturated_executor_fails_fast(self):
+        executor = HashingExecutor(max_workers=1, max_queue=1, retry_after=3)
+        started, release = threading.Event(), threading.Event()
+
+        def hash_slowly():
+            started.set()
+            release.wait(timeout=10)
+
+        submitted, submit = threading.Event(), executor._executor.submit
+
+        def submit_and_notify(*args):
+            future = submit(*args)
+            submitted.set()
+            return future
+
+        running = threading.Thread(target=executor.run, args=(hash_slowly,))
+        queued = threading.Thread(target=executor.run, args=(lambda: None,))
+        running.start()
+        try:
+            self.assertTrue(started.wait(timeout=10))
+            with mock.patch.object(executor._executor, 'submit', side_effect=submit_and_notify):
+                queued.start()
+                self.assertTrue(submitted.wait(timeout=10))
+            with self.assertRaises(HashingUnavailable) as context:
+                executor.run(lambda: None)
+            self.assertEqual(context.exception.wait, 3)
+            self.assertEqual(executor.stats(), {'queue_depth': 1, 'running': 1, 'rejected': 1, })
+        finally:
+            release.set()
+            running.join(timeout=10)
+            if queued.ident is not None:
+                queued.join(timeout=10)
+        self.assertEqual(executor.run(lambda: 1), 1)
+
+    def test_password_upgrades_are_saved_by_the_calling_thread(self):
+        encoded = make_password('password', hasher='pbkdf2_sha256')
+        setter = mock.Mock()
+        with mock.patch.object(hashing, 'hashing_executor', HashingExecutor(max_workers=1)):
+            self.assertTrue(hashing.check_password('password', encoded, setter))
+            self.assertFalse(hashing.check_password('wrong', encoded, setter))
+        setter.assert_called_once_with('password')
+
+
+class HashingExecutorAPITestCase(UserAPITestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.user.is_verified = True
+        self.user.save(auto_hash_password=False)
+        self.executor = HashingExecutor(max_workers=1, max_queue=0, retry_after=5)
+        patcher = mock.patch.object(hashing, 'hashing_executor', self.executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        credentials = base64.b64encode(f'{self.username}:{self.password}'.encode()).decode()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Basic {credentials}')
+
+    def test_users_and_codes_are_verified_on_the_executor(self):
+        with mock.patch.object(self.executor, 'run', wraps=self.executor.run) as run:
+            response = self.client.get(reverse('xauth:profile', kwargs={'pk': self.user.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(run.call_count, 1)
+
+        metadata = update_metadata(self.user, vcode='123456')
+        password = get_user_model().objects.get(pk=self.user.pk).password
+        self.assertTrue(metadata.check_verification_code('123456'))
+        # verifying codes never touches the user's password
+        self.assertEqual(metadata.user.password, password)
+
+    def test_saturated_executor_responds_with_service_unavailable(self):
+        self.executor._slots.acquire()
+        try:
+            response = self.client.get(reverse('xauth:profile', kwargs={'pk': self.user.pk}))
+        finally:
+            self.executor._slots.release()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '5')
+
+
+class CodeHashingTestCase(UserAPITestCase):
+
+    def test_codes_are_hashed_with_a_keyed_hmac(self):
+        metadata = update_metadata(self.user, vcode='123456', tpass='pV55M0r6')
+        for code, raw_code in ((metadata.verification_code, '123456',), (metadata.temporary_password, 'pV55M0r6',),):
+            algorithm, salt, digest = code.split('$')
+            self.assertEqual(algorithm, 'hmac_sha256')
+            self.assertEqual(len(digest), 64)
+            self.assertTrue(hashing.check_code(raw_code, code))
+        self.assertTrue(metadata.check_verification_code('123456'))
+        self.assertFalse(metadata.check_verification_code('654321'))
+        self.assertTrue(metadata.check_temporary_password('pV55M0r6'))
+        self.assertFalse(metadata.check_temporary_password('123456'))
+        # salted per hash
+        self.assertNotEqual(hashing.make_code('123456'), hashing.make_code('123456'))
+
+    def test_digests_are_keyed_with_the_secret_key(self):
+        code = hashing.make_code('123456')
+        with self.settings(SECRET_KEY='another-secret-key'):
+            self.assertFalse(hashing.check_code('123456', code))
+
+    def test_legacy_password_hashed_codes_are_verified(self):
+        metadata = update_metadata(self.user)
+        metadata.verification_code = make_password('123456')
+        self.assertTrue(metadata.check_verification_code('123456'))
+        self.assertFalse(metadata.check_verification_code('654321'))
+        self.assertFalse(hashing.check_code('123456', None))
+        self.assertFalse(hashing.check_code(None, hashing.make_code('123456')))
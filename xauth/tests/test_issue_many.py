@@ -0,0 +1,40 @@
+import itertools
+from unittest import mock
+from datetime import timedelta
+
+from xauth.models import ReferenceTokenRecord
+from xauth.tests import *
+from xauth.utils.reference_token import ReferenceToken
+from xauth.utils.token import Token
+
+
+class IssueManyTestCase(UserAPITestCase):
+
+    def test_tokens_are_issued_in_order_of_users(self):
+        for processes in [1, 2]:
+            issued = list(Token.issue_many(range(7), processes=processes, chunk_size=2))
+            self.assertEqual([payload for payload, _ in issued], list(range(7)))
+            self.assertEqual([Token(None).get_payload(tokens['encrypted']) for _, tokens in issued], list(range(7)))
+
+    def test_payload_subject_and_expiry_of_users_tokens(self):
+        (user, tokens), = Token.issue_many([self.user], subject='migration', expiry=timedelta(days=1), processes=2)
+        claims = Token(None).get_claims(tokens['normal'], encrypted=False)
+        self.assertIs(user, self.user)
+        self.assertEqual(claims['payload'], self.user.token_payload())
+        self.assertEqual(claims['sub'], 'migration')
+        self.assertEqual(claims['exp'] - claims['nbf'], timedelta(days=1).total_seconds())
+
+    def test_users_are_consumed_lazily(self):
+        users = itertools.count()
+        issued = Token.issue_many(users, processes=2, chunk_size=2)
+        self.assertEqual([payload for payload, _ in itertools.islice(issued, 3)], [0, 1, 2])
+        issued.close()
+        # at most two chunks per process were in flight
+        self.assertLessEqual(next(users), 2 * 2 * 2 + 2)
+
+    def test_reference_tokens_are_issued_in_the_current_process(self):
+        with mock.patch('xauth.utils.token.ProcessPoolExecutor') as executor:
+            issued = list(ReferenceToken.issue_many(range(3), processes=2, chunk_size=2))
+        executor.assert_not_called()
+        self.assertEqual([ReferenceToken(None).get_payload(tokens['encrypted']) for _, tokens in issued], [0, 1, 2])
+        self.assertEqual(ReferenceTokenRecord.objects.count(), 3)
@@ -0,0 +1,34 @@
+import json
+
+from jwcrypto import jwk, jwt
+from rest_framework import status
+from rest_framework.reverse import reverse
+
+from xauth.tests import *
+from xauth.utils.token import Token, TokenKey
+
+
+class JWKSViewTestCase(APITestCase):
+
+    def test_jwks_contains_public_key_verifying_issued_tokens(self):
+        token = Token(payload=1)
+        response = self.client.get(reverse('xauth:jwks'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        jwks = jwk.JWKSet.from_json(response.content)
+        kid = Token._get_header(token.normal, ValueError).get('kid')
+        key = jwks.get_key(kid)
+        self.assertIsNotNone(key)
+        self.assertFalse(key.has_private)
+        self.assertEqual(json.loads(jwt.JWT(key=key, jwt=token.normal).claims).get('payload'), 1)
+
+    def test_jwks_response_is_cacheable(self):
+        response = self.client.get(reverse('xauth:jwks'))
+        self.assertIn('max-age=', response['Cache-Control'])
+        etag = response['ETag']
+        self.assertEqual(self.client.get(reverse('xauth:jwks'))['ETag'], etag)
+        response = self.client.get(reverse('xauth:jwks'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_jwks_does_not_expose_symmetric_signing_keys(self):
+        self.assertEqual(TokenKey(signing_algorithm='HS256').get_public_jwks(), {'keys': [], })
@@ -0,0 +1,331 @@
+import os
+import tempfile
+from unittest import mock
+
+from rest_framework.test import APITestCase
+
+from xauth.utils.keyring import KeyRing
+from xauth.utils.token import *
+
+
+class KeyRingTestCase(APITestCase):
+
+    def setUp(self) -> None:
+        self.key_ring = KeyRing()
+        self.file = tempfile.NamedTemporaryFile(delete=False)
+        self.file.write(b'key')
+        self.file.close()
+        self.loads = 0
+
+    def tearDown(self) -> None:
+        os.remove(self.file.name)
+
+    def loader(self, file):
+        self.loads += 1
+        with open(file, 'rb') as f:
+            return f.read()
+
+    def test_key_is_loaded_once_per_ring_key(self):
+        ring_key = ('RS256', 'sign', 2020)
+        key = self.key_ring.get(ring_key, self.file.name, self.loader)
+        key1 = self.key_ring.get(ring_key, self.file.name, self.loader)
+        self.assertIs(key, key1)
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(self.key_ring.stats(), {'hits': 1, 'misses': 1, 'size': 1, })
+
+    def test_modified_key_file_is_reloaded(self):
+        ring_key = ('RS256', 'sign', 2020)
+        self.key_ring.get(ring_key, self.file.name, self.loader)
+        stat = os.stat(self.file.name)
+        os.utime(self.file.name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.key_ring.get(ring_key, self.file.name, self.loader)
+        self.assertEqual(self.loads, 2)
+        self.assertEqual(self.key_ring.stats().get('misses'), 2)
+
+    def test_different_password_reloads_key(self):
+        ring_key = ('RS256', 'sign', 2020)
+        self.key_ring.get(ring_key, self.file.name, self.loader, password=b'password')
+        self.key_ring.get(ring_key, self.file.name, self.loader, password=b'password1')
+        self.assertEqual(self.loads, 2)
+
+    def test_missing_key_file_raises_file_not_found_error(self):
+        with self.assertRaises(FileNotFoundError):
+            self.key_ring.get(('RS256', 'sign', 2020), f'{self.file.name}.missing', self.loader)
+
+    def test_clear_resets_keys_and_counters(self):
+        self.key_ring.get(('RS256', 'sign', 2020), self.file.name, self.loader)
+        self.key_ring.clear()
+        self.assertEqual(self.key_ring.stats(), {'hits': 0, 'misses': 0, 'size': 0, })
+
+    def test_keys_loaded_with_key_id_can_be_found_by_id(self):
+        ring_key = ('RS256', 'sign', 2020)
+        self.key_ring.get(ring_key, self.file.name, self.loader, key_id=lambda key: key.decode())
+        self.assertEqual(self.key_ring.find('RS256', 'sign', 'key'), (ring_key, b'key'))
+        self.assertIsNone(self.key_ring.find('RS256', 'verify', 'key'))
+        # replaced keys are no longer found by their former id
+        with open(self.file.name, 'wb') as f:
+            f.write(b'key1')
+        self.key_ring.get(ring_key, self.file.name, self.loader, key_id=lambda key: key.decode())
+        self.assertIsNone(self.key_ring.find('RS256', 'sign', 'key'))
+        self.assertEqual(self.key_ring.find('RS256', 'sign', 'key1'), (ring_key, b'key1'))
+
+
+class TokenKeyRingTestCase(APITestCase):
+
+    def test_token_keys_are_served_from_key_ring(self):
+        token_key = TokenKey()
+        key = token_key.private_signing_key
+        hits = token_key.key_ring.stats().get('hits')
+        self.assertIs(token_key.private_signing_key, key)
+        self.assertGreater(token_key.key_ring.stats().get('hits'), hits)
+
+    def test_encryption_key_is_shared_across_token_keys(self):
+        self.assertIs(TokenKey().encryption_key, TokenKey().encryption_key)
+        self.assertIn(('ECDH-ES', 'encrypt', datetime.now().year), TokenKey.key_ring)
+
+
+class KeyProvisioningTestCase(APITestCase):
+
+    def setUp(self) -> None:
+        self.keys_root_path = tempfile.mkdtemp()
+        self.token_key = TokenKey()
+        self.token_key.KEYS_ROOT_PATH = self.keys_root_path
+        self.token_key.key_ring = KeyRing()
+
+    def tearDown(self) -> None:
+        import shutil
+        shutil.rmtree(self.keys_root_path, ignore_errors=True)
+
+    def test_keys_are_not_generated_when_key_files_exist(self):
+        self.token_key.private_signing_key
+        self.token_key.encryption_key
+        self.token_key.key_ring.clear()
+        with mock.patch.object(jwk.JWK, 'generate') as generate:
+            self.token_key.private_signing_key
+            self.token_key.encryption_key
+        generate.assert_not_called()
+
+    def test_public_signing_key_is_derived_from_private_signing_key(self):
+        private_key = self.token_key._get_jwt_signing_or_encryption_key(private=True)
+        public_key = self.token_key._get_jwt_signing_or_encryption_key(private=False)
+        self.assertEqual(private_key.thumbprint(), public_key.thumbprint())
+
+    def run_with_timeout(self, fn, timeout=30):
+        import threading
+        results = []
+        thread = threading.Thread(target=lambda: results.append(fn()), daemon=True)
+        thread.start()
+        thread.join(timeout)
+        self.assertFalse(thread.is_alive(), f'{fn} did not return within {timeout}s')
+        return results[0]
+
+    def test_public_signing_key_can_be_provisioned_before_the_private_key(self):
+        for algorithm in ('ES256', 'RS256',):
+            token_key = TokenKey(signing_algorithm=algorithm)
+            token_key.KEYS_ROOT_PATH, token_key.key_ring = os.path.join(self.keys_root_path, algorithm), KeyRing()
+            public_key = self.run_with_timeout(lambda: token_key._get_jwt_signing_or_encryption_key(private=False))
+            self.assertEqual(public_key.thumbprint(), token_key._get_jwt_signing_or_encryption_key().thumbprint())
+
+    def test_public_keys_are_provisioned_while_verifying_with_public_keys(self):
+        token_class = type('PublicKeyToken', (Token,), {
+            'signing_client': mock.Mock(),
+            'KEYS_ROOT_PATH': self.keys_root_path,
+            'key_ring': KeyRing(),
+        })
+        jwks = self.run_with_timeout(lambda: token_class(None).get_public_jwks())
+        self.assertEqual(len(jwks['keys']), 1)
+
+    def test_concurrent_provisioning_writes_key_file_once(self):
+        from concurrent.futures import ThreadPoolExecutor
+        file = os.path.join(self.keys_root_path, 'key.pem')
+        created = []
+
+        def create():
+            created.append(1)
+            return os.urandom(32)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: TokenKey._provision_key_file(file, create), range(16)))
+        self.assertEqual(len(created), 1)
+        # neither temporary nor lock files are left behind
+        self.assertEqual(os.listdir(self.keys_root_path), ['key.pem'])
+
+    def test_provisioned_key_files_permissions_follow_the_umask(self):
+        for umask, mode in ((0o022, 0o644,), (0o077, 0o600,),):
+            token_key = TokenKey(signing_algorithm='HS256', encryption_algorithm='dir')
+            token_key.KEYS_ROOT_PATH, token_key.key_ring = os.path.join(self.keys_root_path, oct(umask)), KeyRing()
+            previous_umask = os.umask(umask)
+            try:
+                token_key.preload()
+                self.token_key.KEYS_ROOT_PATH = token_key.KEYS_ROOT_PATH
+                self.token_key.preload()
+            finally:
+                os.umask(previous_umask)
+            files = [os.path.join(directory, file) for directory, _, files in os.walk(token_key.KEYS_ROOT_PATH)
+                     for file in files]
+            # symmetric secrets, private & public signing keys and encryption keys
+            self.assertGreaterEqual(len(files), 5)
+            for file in files:
+                self.assertEqual(os.stat(file).st_mode & 0o777, mode, file)
+
+    def test_failed_provisioning_leaves_no_key_file(self):
+        file = os.path.join(self.keys_root_path, 'key.pem')
+
+        def create():
+            raise ValueError('key generation failed')
+
+        with self.assertRaises(ValueError):
+            TokenKey._provision_key_file(file, create)
+        self.assertFalse(os.path.exists(file))
+        self.assertEqual([f for f in os.listdir(self.keys_root_path) if f.endswith('.tmp')], [])
+
+
+class KeyPreloadTestCase(APITestCase):
+
+    def setUp(self) -> None:
+        self.keys_root_path = tempfile.mkdtemp()
+        self.token_key = TokenKey(signing_algorithm='ES256')
+        self.token_key.KEYS_ROOT_PATH = self.keys_root_path
+        self.token_key.key_ring = KeyRing()
+
+    def tearDown(self) -> None:
+        import shutil
+        shutil.rmtree(self.keys_root_path, ignore_errors=True)
+
+    def test_preload_loads_signing_and_encryption_keys_into_key_ring(self):
+        self.token_key.preload()
+        # private & public signing keys + encryption key
+        self.assertEqual(len(self.token_key.key_ring), 3)
+        misses = self.token_key.key_ring.stats().get('misses')
+        self.token_key.private_signing_key, self.token_key.encryption_key
+        self.assertEqual(self.token_key.key_ring.stats().get('misses'), misses)
+
+    def test_preload_regenerates_public_key_of_independently_generated_legacy_pair(self):
+        token_key = TokenKey(signing_algorithm='RS256')
+        token_key.KEYS_ROOT_PATH, token_key.key_ring = self.keys_root_path, KeyRing()
+        file_name, path = token_key._get_signing_or_encryption_key_filename_and_path(True, False)
+        os.makedirs(path)
+        year = datetime.now().year
+        # earlier versions generated the private & public keys independently
+        for private in (True, False,):
+            file_name, _ = token_key._get_signing_or_encryption_key_filename_and_path(private, False)
+            with open(os.path.join(path, f'{file_name}_{year}.pem'), 'wb') as pem:
+                pem.write(jwk.JWK.generate(kty='RSA', size=2048).export_to_pem(
+                    private_key=private, password=token_key.password if private else None))
+        private = token_key._get_jwt_signing_or_encryption_key(year=year)
+        self.assertNotEqual(token_key._get_jwt_signing_or_encryption_key(False, year=year).thumbprint(),
+                            private.thumbprint())
+
+        token_key.preload()
+        self.assertEqual(token_key._get_jwt_signing_or_encryption_key(False, year=year).thumbprint(),
+                         private.thumbprint())
+        # the private key is kept i.e. tokens signed before remain valid
+        self.assertEqual(token_key._get_jwt_signing_or_encryption_key(year=year).thumbprint(), private.thumbprint())
+        self.assertFalse(token_key._derive_public_signing_key(year))
+
+    def test_app_ready_preloads_keys_if_enabled(self):
+        from django.apps import apps
+        config = apps.get_app_config('xauth')
+        with mock.patch.object(config, 'preload') as preload:
+            with mock.patch.dict('xauth.utils.settings.XAUTH', PRELOAD_KEYS=False):
+                config.ready()
+            preload.assert_not_called()
+            with mock.patch.dict('xauth.utils.settings.XAUTH', PRELOAD_KEYS=True):
+                config.ready()
+            preload.assert_called_once()
+
+    def test_warmup_command_reports_every_step(self):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        with mock.patch.object(Token, 'KEYS_ROOT_PATH', self.keys_root_path), \
+                mock.patch.object(Token, 'key_ring', KeyRing()):
+            call_command('xauth_warmup', stdout=out)
+        for step in ('keys', 'hasher', 'serializers'):
+            self.assertIn(step, out.getvalue())
+
+
+class LastYearDatetime(datetime):
+
+    @classmethod
+    def now(cls, tz=None):
+        return datetime.now(tz) - timedelta(days=366)
+
+
+class KeyRotationTestCase(APITestCase):
+
+    def setUp(self) -> None:
+        self.keys_root_path = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        import shutil
+        shutil.rmtree(self.keys_root_path, ignore_errors=True)
+
+    def token(self, payload=None, **kwargs):
+        # every token gets its own key ring as if used in a different process
+        token = Token(payload, **kwargs)
+        token.KEYS_ROOT_PATH = self.keys_root_path
+        token.key_ring = KeyRing()
+        return token
+
+    def test_tokens_carry_the_id_of_their_keys(self):
+        token = self.token(1)
+        self.assertEqual(Token._get_header(token.normal, ValueError).get('kid'),
+                         Token.get_key_id(token.private_signing_key))
+        self.assertEqual(Token._get_header(token.encrypted, ValueError).get('kid'),
+                         Token.get_key_id(token.encryption_key))
+
+    def test_ids_of_symmetric_keys_do_not_reveal_the_keys(self):
+        for signing_algorithm, encryption_algorithm in (('HS256', 'dir',), ('HS256', 'A256KW',),):
+            with self.subTest(encryption_algorithm=encryption_algorithm):
+                token = self.token(1, signing_algorithm=signing_algorithm, encryption_algorithm=encryption_algorithm)
+                for key, serialized in ((token.private_signing_key, token.normal,),
+                                        (token.encryption_key, token.encrypted,),):
+                    kid = Token._get_header(serialized, ValueError).get('kid')
+                    self.assertEqual(kid, Token.get_key_id(key))
+                    self.assertNotEqual(kid, key.thumbprint())
+                    # stable across loads of the key
+                    self.assertEqual(kid, Token.get_key_id(jwk.JWK(**key)))
+                reader = self.token(signing_algorithm=signing_algorithm, encryption_algorithm=encryption_algorithm)
+                self.assertEqual(reader.get_payload(token.normal, encrypted=False), 1)
+                self.assertEqual(reader.get_payload(token.encrypted, encrypted=True), 1)
+
+    def test_tokens_issued_with_previous_year_keys_are_accepted_after_rotation(self):
+        with mock.patch('xauth.utils.token.datetime', LastYearDatetime):
+            token = self.token(1, expiry_period=timedelta(days=400))
+            encrypted = token.encrypted
+        current = self.token()
+        self.assertNotEqual(Token._get_header(token.normal, ValueError).get('kid'),
+                            Token.get_key_id(current.private_signing_key))
+        self.assertEqual(current.get_payload(encrypted, encrypted=True), 1)
+        self.assertEqual(self.token().get_payload(token.normal, encrypted=False), 1)
+
+    def test_tokens_issued_with_retired_keys_are_rejected(self):
+        with mock.patch('xauth.utils.token.datetime', LastYearDatetime):
+            token = self.token(1, expiry_period=timedelta(days=400))
+            encrypted = token.encrypted
+        with mock.patch.dict(TokenKey.KEY_ROTATION, RETAIN_PERIODS=0):
+            with self.assertRaises(jwe.JWException):
+                self.token().get_payload(encrypted, encrypted=True)
+            with self.assertRaises(jwe.JWException):
+                self.token().get_payload(token.normal, encrypted=False)
+
+    def test_tokens_with_unknown_key_id_are_rejected(self):
+        token = self.token()
+        forged = jwt.JWT(header={'alg': 'RS256', 'kid': 'unknown', }, claims={'payload': 1, })
+        forged.make_signed_token(key=token.private_signing_key)
+        with self.assertRaises(jws.InvalidJWSSignature):
+            token.get_payload(forged.serialize(), encrypted=False)
+
+    def test_next_year_keys_are_generated_in_advance(self):
+        token = self.token()
+        next_year = datetime.now().year + 1
+        with mock.patch.dict(TokenKey.KEY_ROTATION, PREGENERATE_DAYS=0):
+            self.assertFalse(token.provision_next_year_keys())
+        self.assertFalse(os.path.exists(os.path.join(self.keys_root_path, 'sig', f'key_pri_{next_year}.pem')))
+        with mock.patch.dict(TokenKey.KEY_ROTATION, PREGENERATE_DAYS=366):
+            self.assertTrue(token.provision_next_year_keys())
+        for file in (f'sig/key_pri_{next_year}.pem', f'sig/key_pub_{next_year}.pem', f'enc/key_{next_year}.pem'):
+            self.assertTrue(os.path.exists(os.path.join(self.keys_root_path, file)))
+        # loaded in advance
+        self.assertIn(('RS256', 'sign', next_year), token.key_ring)
@@ -0,0 +1,57 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APITestCase
+
+from xauth import authentication
+from xauth.utils.lazy_user import LazyTokenUser
+from xauth.utils.token import Token
+
+
+class LazyTokenUserTestCase(APITestCase):
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(username='user', email='user@mail-domain.com', )
+        self.backend = authentication.BasicTokenAuthentication()
+        self.backend.lazy_token_user = True
+        self.backend.claims_cache = None
+        self.backend.user_cache = None
+        self.token = Token(self.user.token_payload(compact=True), subject='account-verification').encrypted
+
+    def authenticate(self, token=None):
+        return self.backend.get_user_from_jwt_token(token or self.token, 'http://testserver/')
+
+    def test_payload_attributes_are_served_without_database_queries(self):
+        user = self.authenticate()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(user.id, self.user.id)
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertIs(user.is_active, True)
+            self.assertIs(user.is_superuser, False)
+            self.assertIs(user.is_authenticated, True)
+        self.assertEqual(len(queries), 0)
+        self.assertIs(user.is_loaded, False)
+
+    def test_user_is_fetched_when_other_attributes_are_accessed(self):
+        user = self.authenticate()
+        self.assertEqual(user.email, 'user@mail-domain.com')
+        self.assertIs(user.is_loaded, True)
+        self.assertEqual(user, self.user)
+
+    def test_attributes_assigned_before_user_is_fetched_are_applied_to_fetched_user(self):
+        user = self.authenticate()
+        user.device_ip = '127.0.0.1'
+        self.assertEqual(user.device_ip, '127.0.0.1')
+        self.assertEqual(user.username, 'user')
+        self.assertEqual(user._wrapped.device_ip, '127.0.0.1')
+
+    def test_fetching_deleted_user_raises_authentication_failed(self):
+        user = self.authenticate()
+        get_user_model().objects.filter(pk=self.user.pk).delete()
+        with self.assertRaises(AuthenticationFailed):
+            user.email
+
+    def test_lazy_user_is_not_returned_if_disabled(self):
+        self.backend.lazy_token_user = False
+        self.assertNotIsInstance(self.authenticate(), LazyTokenUser)
@@ -1,4 +1,7 @@
+from unittest import mock
+
 from xauth.tests import *
+from xauth.utils import hashing
 
 
 class MetadataTestCase(APITestCase):
@@ -60,3 +63,54 @@ class MetadataTestCase(APITestCase):
         meta = update_metadata(self.user, sec_quest=security_quest, sec_ans=sec_quest_answer, )
         self.assertIs(meta.is_usable_code(meta.security_question_answer), True)
         self.assertIs(meta.check_security_question_answer(sec_quest_answer), True)
+
+    def test_saving_unchanged_codes_does_not_rehash_them(self):
+        security_quest, sec_quest_answer = create_security_question(), 'blue'
+        update_metadata(self.user, sec_quest=security_quest, sec_ans=sec_quest_answer, tpass='password', vcode='123456')
+        meta = Metadata.objects.get(pk=self.user.pk)
+        hashes = [meta.security_question_answer, meta.verification_code, meta.temporary_password]
+        with mock.patch.object(hashing, 'make_code') as make_code, \
+                mock.patch.object(get_user_model(), '_hash_code') as hash_code:
+            meta.vc_gen_time = timezone.now()
+            meta.save()
+        make_code.assert_not_called()
+        hash_code.assert_not_called()
+        meta = Metadata.objects.get(pk=self.user.pk)
+        self.assertEqual([meta.security_question_answer, meta.verification_code, meta.temporary_password], hashes)
+        self.assertIs(meta.check_security_question_answer(sec_quest_answer), True)
+        self.assertIs(meta.check_verification_code('123456'), True)
+        self.assertIs(meta.check_temporary_password('password'), True)
+
+    def test_only_changed_codes_are_hashed(self):
+        security_quest = create_security_question()
+        update_metadata(self.user, sec_quest=security_quest, sec_ans='blue', vcode='123456')
+        meta = Metadata.objects.get(pk=self.user.pk)
+        meta.security_question_answer = 'red'
+        with mock.patch.object(hashing, 'make_code') as make_code:
+            meta.save()
+        make_code.assert_not_called()
+        meta = Metadata.objects.get(pk=self.user.pk)
+        self.assertIs(meta.check_security_question_answer('red'), True)
+        self.assertIs(meta.check_verification_code('123456'), True)
+
+    def test_update_fields_saves_only_hash_the_updated_fields(self):
+        update_metadata(self.user, sec_quest=create_security_question(), sec_ans='blue')
+        meta = Metadata.objects.get(pk=self.user.pk)
+        meta.vc_gen_time = timezone.now()
+        with mock.patch.object(get_user_model(), '_hash_code') as hash_code, self.assertNumQueries(1):
+            meta.save(update_fields=['vc_gen_time'])
+        hash_code.assert_not_called()
+
+        meta.verification_code = '654321'
+        meta.save(update_fields=['verification_code'])
+        self.assertIs(Metadata.objects.get(pk=self.user.pk).check_verification_code('654321'), True)
+
+    def test_deferred_codes_are_not_rehashed(self):
+        update_metadata(self.user, vcode='123456')
+        meta = Metadata.objects.defer('verification_code').get(pk=self.user.pk)
+        meta.vc_gen_time = timezone.now()
+        meta.save()
+        # loaded after the save
+        self.assertIs(meta.check_verification_code('123456'), True)
+        meta.save()
+        self.assertIs(Metadata.objects.get(pk=self.user.pk).check_verification_code('123456'), True)
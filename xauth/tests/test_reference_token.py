@@ -0,0 +1,112 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache as django_cache
+from django.urls import reverse
+from jwcrypto import jwe, jwt
+from rest_framework import status
+
+from xauth.models import ReferenceTokenRecord
+from xauth.tests import *
+from xauth.utils.cache import LocalCache
+from xauth.utils.reference_token import ReferenceToken, get_token_class
+from xauth.utils.token import Token
+
+
+class ReferenceTokenTestCase(APITestCase):
+
+    def setUp(self) -> None:
+        django_cache.clear()
+
+    def test_reference_token_is_opaque_and_maps_to_stored_claims(self):
+        token = ReferenceToken(payload={'id': 1, })
+        self.assertEqual(token.normal, token.encrypted)
+        self.assertTrue(ReferenceToken.is_reference_token(token.normal))
+        self.assertFalse(ReferenceToken.is_reference_token(Token(payload=1).normal))
+        self.assertEqual(ReferenceToken(None).get_payload(token.normal), {'id': 1, })
+        # only a digest of the token is stored
+        self.assertFalse(ReferenceTokenRecord.objects.filter(digest=token.normal).exists())
+        self.assertTrue(ReferenceTokenRecord.objects.filter(digest=ReferenceToken.get_digest(token.normal)).exists())
+
+    def test_claims_are_read_from_cache_with_database_as_fallback(self):
+        token = ReferenceToken(payload=1).normal
+        with self.assertNumQueries(0):
+            self.assertEqual(ReferenceToken(None).get_payload(token), 1)
+        django_cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(ReferenceToken(None).get_payload(token), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(ReferenceToken(None).get_payload(token), 1)
+
+    def test_revoked_token_is_rejected_immediately(self):
+        token = ReferenceToken(payload=1)
+        token.revoke()
+        self.assertTrue(ReferenceToken.is_revoked(token.normal))
+        with self.assertRaises(jwe.JWException):
+            ReferenceToken(None).get_claims(token.normal)
+        self.assertFalse(ReferenceTokenRecord.objects.exists())
+
+    def test_revocation_is_not_undone_by_a_concurrent_lookup(self):
+        import json
+        token = ReferenceToken(payload=1).normal
+        django_cache.clear()
+        json_loads = json.loads
+
+        def loads(*args, **kwargs):
+            # revoked after the lookup read the record from the database
+            ReferenceToken(None).revoke(token)
+            return json_loads(*args, **kwargs)
+
+        with mock.patch('xauth.utils.reference_token.json.loads', side_effect=loads):
+            ReferenceToken(None).get_claims(token)
+        with self.assertRaises(jwe.JWException):
+            ReferenceToken(None).get_claims(token)
+
+    def test_expired_token_is_rejected(self):
+        token = ReferenceToken(payload=1, expiry_period=timedelta(seconds=1))
+        with mock.patch('xauth.utils.reference_token.time.time', return_value=time.time() + 2):
+            with self.assertRaises(jwt.JWTExpired):
+                ReferenceToken(None).get_claims(token.normal)
+
+    def test_purge_expired_deletes_records_of_expired_tokens(self):
+        ReferenceToken(payload=1, expiry_period=timedelta(seconds=1)).normal
+        ReferenceToken(payload=2).normal
+        with mock.patch('xauth.utils.reference_token.time.time', return_value=time.time() + 2):
+            self.assertEqual(ReferenceToken.purge_expired(), 1)
+        self.assertEqual(ReferenceTokenRecord.objects.count(), 1)
+
+    def test_get_token_class(self):
+        self.assertIs(get_token_class('reference'), ReferenceToken)
+        self.assertIs(get_token_class('jwt'), Token)
+
+
+class ReferenceTokenAuthenticationTestCase(UserAPITestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        django_cache.clear()
+        self.user.is_verified = True
+        self.user.save()
+        patcher = mock.patch.object(get_user_model(), 'token_class', ReferenceToken)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reference_token_authenticates_until_sign_out(self):
+        token = self.user.token.normal
+        self.assertTrue(ReferenceToken.is_reference_token(token))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get(reverse('xauth:profile', kwargs={'pk': self.user.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse('xauth:signout'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('xauth:profile', kwargs={'pk': self.user.pk}))
+        self.assertIn(response.status_code, [status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN])
+
+    def test_revoked_token_is_not_reused(self):
+        with mock.patch.object(get_user_model(), 'issued_tokens_cache', LocalCache(prefix='test')):
+            token = get_user_model().objects.get(pk=self.user.pk).token.normal
+            self.assertEqual(get_user_model().objects.get(pk=self.user.pk).token.normal, token)
+            ReferenceToken(None).revoke(token)
+            self.assertNotEqual(get_user_model().objects.get(pk=self.user.pk).token.normal, token)
@@ -0,0 +1,107 @@
+import time
+import uuid
+from unittest import mock
+
+from django.urls import reverse
+from rest_framework import status
+
+from xauth import authentication
+from xauth.models import RevokedToken
+from xauth.tests import *
+from xauth.utils import revocation
+from xauth.utils.bloom import BloomFilter
+from xauth.utils.cache import LocalCache
+from xauth.utils.revocation import RevocationList
+from xauth.utils.token import Token
+
+
+class BloomFilterTestCase(APITestCase):
+
+    def test_added_items_are_always_found(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        items = [uuid.uuid4().hex for _ in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+        self.assertEqual(len(bloom), 1000)
+
+    def test_false_positive_rate_is_close_to_error_rate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for _ in range(1000):
+            bloom.add(uuid.uuid4().hex)
+        false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+        self.assertLess(false_positives / 10000, 0.03)
+
+
+class RevocationListTestCase(APITestCase):
+
+    def setUp(self) -> None:
+        self.revocation_list = RevocationList(capacity=1000, sync_interval=60)
+
+    def test_tokens_that_were_not_revoked_are_checked_without_querying_the_database(self):
+        self.revocation_list.revoke('revoked', time.time() + 60)
+        with self.assertNumQueries(0):
+            self.assertFalse(self.revocation_list.is_revoked(uuid.uuid4().hex))
+        with self.assertNumQueries(1):
+            self.assertTrue(self.revocation_list.is_revoked('revoked'))
+
+    def test_filter_positives_are_confirmed_with_the_database(self):
+        self.revocation_list.revoke('revoked', time.time() + 60)
+        RevokedToken.objects.all().delete()
+        self.assertFalse(self.revocation_list.is_revoked('revoked'))
+
+    def test_revocations_by_other_processes_are_picked_up_on_sync(self):
+        other = RevocationList(capacity=1000, sync_interval=60)
+        self.assertFalse(self.revocation_list.is_revoked('revoked'))
+        other.revoke('revoked', time.time() + 60)
+        self.assertFalse(self.revocation_list.is_revoked('revoked'))
+        self.revocation_list.sync()
+        self.assertTrue(self.revocation_list.is_revoked('revoked'))
+
+    def test_rebuild_drops_expired_revocations(self):
+        self.revocation_list.revoke('expired', time.time() - 1)
+        self.revocation_list.sync(rebuild=True)
+        with self.assertNumQueries(0):
+            self.assertFalse(self.revocation_list.is_revoked('expired'))
+        self.assertEqual(RevocationList.purge_expired(), 1)
+
+
+class TokenRevocationTestCase(UserAPITestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.user.is_verified = True
+        self.user.save()
+        patcher = mock.patch.object(revocation, 'revocation_list', RevocationList(capacity=1000))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_tokens_carry_unique_ids(self):
+        self.assertNotEqual(Token(payload=1).get_claims().get('jti'), Token(payload=1).get_claims().get('jti'))
+
+    def test_signed_out_token_is_rejected(self):
+        token = self.user.token.encrypted
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get(reverse('xauth:profile', kwargs={'pk': self.user.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.post(reverse('xauth:signout'))
+        self.assertTrue(RevokedToken.objects.filter(jti=Token(None).get_claims(token).get('jti')).exists())
+        # revocation applies to tokens whose claims were cached
+        self.assertIsNotNone(authentication.BasicTokenAuthentication.claims_cache)
+        response = self.client.get(reverse('xauth:profile', kwargs={'pk': self.user.pk}))
+        self.assertIn(response.status_code, [status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN])
+
+    def test_tokens_are_not_verified_while_revocation_is_disabled(self):
+        with mock.patch.object(revocation, 'revocation_list', None), \
+                mock.patch.object(Token, 'get_claims') as get_claims:
+            Token(None).revoke('token')
+        get_claims.assert_not_called()
+
+    def test_revoked_token_is_not_reused(self):
+        with mock.patch.object(get_user_model(), 'issued_tokens_cache', LocalCache(prefix='test')):
+            token = get_user_model().objects.get(pk=self.user.pk).token
+            encrypted = token.encrypted
+            self.assertEqual(get_user_model().objects.get(pk=self.user.pk).token.encrypted, encrypted)
+            token.revoke(encrypted)
+            self.assertNotEqual(get_user_model().objects.get(pk=self.user.pk).token.encrypted, encrypted)
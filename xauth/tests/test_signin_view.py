@@ -61,3 +61,16 @@ class SignInViewTestCase(APITestCase):
 
     def test_signing_in_with_invalid_post_request_username_and_password_returns_401(self):
         self.assert_post_request_auth('user1', 'password1', status.HTTP_401_UNAUTHORIZED)
+
+    def test_signing_in_only_returns_token_types_in_return_token_type(self):
+        from unittest import mock
+        from xauth.utils.enums import TokenType
+        from xauth.utils.token import Token
+        with mock.patch.object(Token, 'RETURN_TOKEN_TYPE', TokenType.NORMAL):
+            response = self.client.post(reverse('xauth:signin'), data={
+                'username': 'user',
+                'password': 'password',
+            })
+        payload = response.data.get('payload')
+        self.assertIn('normal', payload)
+        self.assertNotIn('encrypted', payload)
@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from rest_framework.test import APITestCase
+
+from xauth.utils.keyring import KeyRing
+from xauth.utils.signing_service import SigningClient, SigningService, SigningServiceError
+from xauth.utils.token import Token
+
+
+class SigningServiceTestCase(APITestCase):
+
+    def setUp(self) -> None:
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        for name, value in (('KEYS_ROOT_PATH', os.path.join(directory, 'keys'),), ('key_ring', KeyRing(),),):
+            patcher = mock.patch.object(Token, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.path = os.path.join(directory, 'signing.sock')
+        self.service = SigningService(self.path).start()
+        self.addCleanup(lambda: self.service.stop())
+        self.client = SigningClient(self.path, timeout=10, fallback=False)
+        self.addCleanup(self.client.close)
+        patcher = mock.patch.object(Token, 'signing_client', self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_tokens_are_issued_by_the_service(self):
+        with mock.patch.object(self.client, 'issue', wraps=self.client.issue) as issue:
+            token = Token(payload=1)
+            self.assertEqual(Token(None).get_payload(token.encrypted), 1)
+            self.assertEqual(Token(None).get_payload(token.normal, encrypted=False), 1)
+        # signed & encrypted in a single round trip
+        self.assertEqual(issue.call_count, 1)
+
+    def test_signed_token_is_encrypted_by_the_service(self):
+        with mock.patch.object(Token, 'signing_client', None):
+            normal = Token(payload=1).normal
+        token = Token(payload=1)
+        token._normal = normal
+        self.assertEqual(Token(None).get_claims(token.encrypted, encrypted=True),
+                         Token(None).get_claims(normal, encrypted=False))
+
+    def test_concurrent_requests_are_all_issued(self):
+        def issue(payload):
+            return Token(payload=payload).encrypted
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            tokens = list(executor.map(issue, range(32)))
+        self.assertEqual([Token(None).get_payload(token) for token in tokens], list(range(32)))
+
+    def test_service_errors_are_raised(self):
+        with self.assertRaises(SigningServiceError):
+            self.client.issue('none', 'ECDH-ES', claims={})
+
+    def test_client_reconnects_after_service_restart(self):
+        self.assertEqual(Token(None).get_payload(Token(payload=1).encrypted), 1)
+        self.service.stop()
+        self.service = SigningService(self.path).start()
+        self.assertEqual(Token(None).get_payload(Token(payload=2).encrypted), 2)
+
+    def test_tokens_are_issued_locally_while_the_service_is_unreachable(self):
+        self.service.stop()
+        with self.assertRaises(OSError):
+            Token(payload=1).encrypted
+        self.client.fallback = True
+        self.assertEqual(Token(None).get_payload(Token(payload=1).encrypted), 1)
+
+    def test_tokens_are_issued_locally_when_the_service_fails_to_issue_them(self):
+        with mock.patch.object(self.service, '_issue', side_effect=FileNotFoundError('key_pri_2026.pem')):
+            with self.assertRaises(SigningServiceError):
+                Token(payload=1).encrypted
+            self.client.fallback = True
+            self.assertEqual(Token(None).get_payload(Token(payload=1).encrypted), 1)
+
+    def test_requests_beyond_the_queue_limit_are_rejected(self):
+        # never started i.e. requests are only queued
+        service = SigningService(f'{self.path}.idle', max_queue=1)
+        self.assertFalse(service.submit({}).done())
+        self.assertTrue(service.submit({}).result(timeout=0)['error'].startswith('busy'))
+
+    def test_requests_the_client_stopped_waiting_for_are_dropped(self):
+        with mock.patch.object(self.service, '_issue', wraps=self.service._issue) as issue:
+            response = self.service.submit({'deadline': time.time() - 1, }).result(timeout=10)
+        self.assertTrue(response['error'].startswith('expired'))
+        issue.assert_not_called()
+
+    def test_tokens_are_issued_by_a_pool_of_workers(self):
+        self.assertEqual(self.service.workers, 4)
+        # the server's thread & the issuing threads
+        self.assertEqual(len(self.service._threads), 1 + self.service.workers)
+
+    def test_tokens_are_verified_without_loading_private_signing_keys(self):
+        encrypted = Token(payload=1).encrypted
+        with mock.patch.object(Token, 'key_ring', KeyRing()), \
+                mock.patch.object(Token, '_get_key_from_pem', autospec=True,
+                                  side_effect=Token._get_key_from_pem) as get_key_from_pem:
+            self.assertEqual(Token(None).get_payload(encrypted), 1)
+            self.assertEqual(Token(None).get_public_jwks()['keys'][0]['kid'], Token(None).get_key_id(
+                Token(None).public_signing_key))
+            ring_keys = list(Token.key_ring._keys)
+        private_files = [call.args[1] for call in get_key_from_pem.call_args_list
+                         if call.args[2] and '/sig/' in call.args[1]]
+        self.assertEqual(private_files, [])
+        self.assertNotIn('sign', [purpose for _, purpose, _ in ring_keys])
+        self.assertIn('verify', [purpose for _, purpose, _ in ring_keys])
@@ -104,3 +104,89 @@ class TokenTest(APITestCase):
         token1 = Token(payload=111)
         self.assertEqual(token.get_payload(), 1)
         self.assertEqual(token.get_payload(token1.normal, encrypted=False), 111)
+
+    def test_accessing_normal_token_does_not_encrypt(self):
+        token = Token(payload=1)
+        self.assertIsNotNone(token.normal)
+        self.assertIsNone(token._encrypted)
+
+    def test_encrypted_token_wraps_normal_token(self):
+        token = Token(payload=1)
+        encrypted = token.encrypted
+        self.assertIsNotNone(token._normal)
+        self.assertEqual(token.get_claims(encrypted, encrypted=True), token.get_claims(token.normal, encrypted=False))
+
+    def test_refresh_discards_previously_generated_tokens(self):
+        token = Token(payload=1)
+        normal = token.normal
+        token.refresh()
+        self.assertIsNot(token._normal, normal)
+
+    def test_tokens_only_contains_token_types_in_return_token_type(self):
+        from unittest import mock
+        from xauth.utils.enums import TokenType
+        with mock.patch.object(Token, 'RETURN_TOKEN_TYPE', TokenType.NORMAL):
+            token = Token(payload=1)
+            self.assertEqual(list(token.tokens.keys()), ['normal'])
+            self.assertIsNone(token._encrypted)
+        with mock.patch.object(Token, 'RETURN_TOKEN_TYPE', TokenType.ENCRYPTED):
+            self.assertEqual(list(Token(payload=1).tokens.keys()), ['encrypted'])
+        with mock.patch.object(Token, 'RETURN_TOKEN_TYPE', TokenType.BOTH):
+            self.assertEqual(list(Token(payload=1).tokens.keys()), ['normal', 'encrypted'])
+
+    def test_get_payload_with_es256_and_eddsa_algorithms(self):
+        for algorithm in ['ES256', 'EdDSA']:
+            token = Token(payload=1, signing_algorithm=algorithm)
+            self.assertEqual(token.get_payload(), 1)
+            self.assertEqual(jwt.JWT(jwt=token.normal).token.jose_header.get('alg'), algorithm)
+
+    def test_signing_algorithms_do_not_share_key_files(self):
+        files = {TokenKey(signing_algorithm=algorithm)._get_signing_or_encryption_key_filename_and_path(True, False)
+                 for algorithm in ['RS256', 'ES256', 'EdDSA']}
+        self.assertEqual(len(files), 3)
+
+    def test_token_signed_with_one_algorithm_is_not_verified_with_another_algorithms_key(self):
+        from jwcrypto.jws import InvalidJWSSignature
+        token = Token(payload=1, signing_algorithm='ES256')
+        with self.assertRaises(InvalidJWSSignature):
+            Token(None, signing_algorithm='EdDSA').get_claims(token.normal, encrypted=False)
+
+    def test_benchmark_command_reports_every_algorithm(self):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('xauth_benchmark', '--iterations', '1', '--algorithms', 'ES256', 'EdDSA', stdout=out)
+        self.assertIn('ES256', out.getvalue())
+        self.assertIn('EdDSA', out.getvalue())
+        self.assertIn('zip=DEF', out.getvalue())
+
+    def test_get_payload_with_symmetric_encryption_algorithms(self):
+        for algorithm in TokenKey.SYMMETRIC_ENCRYPTION_ALGORITHMS:
+            token = Token(payload=1, encryption_algorithm=algorithm)
+            self.assertEqual(token.get_payload(token.encrypted, encrypted=True), 1)
+            self.assertEqual(jwt.JWT(jwt=token.normal).token.jose_header.get('alg'), 'RS256')
+
+    def test_tokens_encrypted_with_either_algorithm_are_accepted(self):
+        ecdh_token = Token(payload=1, encryption_algorithm='ECDH-ES')
+        dir_token = Token(payload=2, encryption_algorithm='dir')
+        self.assertEqual(Token(None, encryption_algorithm='dir').get_payload(ecdh_token.encrypted), 1)
+        self.assertEqual(Token(None, encryption_algorithm='ECDH-ES').get_payload(dir_token.encrypted), 2)
+
+    def test_decryption_key_is_not_generated_for_unconfigured_algorithm(self):
+        from unittest import mock
+        from jwcrypto.jwe import InvalidJWEData
+        token = Token(payload=1, encryption_algorithm='A256KW')
+        token.encrypted
+        from xauth.utils.keyring import KeyRing
+        with mock.patch.object(TokenKey, '_get_symmetric_encryption_key', side_effect=FileNotFoundError) as get_key, \
+                mock.patch.object(TokenKey, 'key_ring', KeyRing()):
+            with self.assertRaises(InvalidJWEData):
+                Token(None, encryption_algorithm='ECDH-ES').get_claims(token.encrypted)
+        self.assertTrue(get_key.called)
+        for call in get_key.call_args_list:
+            self.assertEqual(call[0][:2], ('A256KW', False))
+
+    def test_malformed_encrypted_token_raises_invalid_jwe_data(self):
+        from jwcrypto.jwe import InvalidJWEData
+        with self.assertRaises(InvalidJWEData):
+            Token(None).get_claims('not-a-token')
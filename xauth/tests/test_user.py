@@ -484,3 +484,111 @@ class UserTestCase(APITestCase):
         self.assertEqual(metadata.security_question_id, question.id)
         # answer to the question in database matches the provided answer
         self.assertIs(metadata.check_security_question_answer(answer), True)
+
+    def test_token_is_memoized_on_user_instance(self):
+        user = get_user_model().objects.create_superuser('admin@mail-domain.com', 'admin', 'password')
+        token = user.token
+        self.assertIs(user.token, token)
+        # a different user instance issues its own token
+        self.assertIsNot(get_user_model().objects.get(pk=user.pk).token, token)
+
+    def test_memoized_token_is_invalidated_when_token_payload_changes(self):
+        user = get_user_model().objects.create_superuser('admin@mail-domain.com', 'admin', 'password')
+        token = user.token
+        user.first_name = 'John'
+        self.assertIsNot(user.token, token)
+        self.assertEqual(user.token.payload.get('first_name'), 'John')
+
+    def test_memoized_tokens_are_kept_per_subject(self):
+        user = get_user_model().objects.create_superuser('admin@mail-domain.com', 'admin', 'password')
+        self.assertIsNot(user.token, user.password_reset_token)
+        self.assertEqual(user.password_reset_token.subject, 'password-reset')
+        user.is_active = False
+        self.assertEqual(user.token.subject, 'account-activation')
+
+    def test_expired_memoized_token_is_not_reused(self):
+        user = get_user_model().objects.create_superuser('admin@mail-domain.com', 'admin', 'password')
+        token = user.token
+        token.activation_date = datetime.now() - timedelta(days=61)
+        self.assertIsNot(user.token, token)
+
+
+class TokenReuseTestCase(APITestCase):
+
+    def setUp(self) -> None:
+        from unittest import mock
+        from xauth.utils.cache import LocalCache
+        patcher = mock.patch.object(User, 'issued_tokens_cache', LocalCache(prefix='test'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = get_user_model().objects.create_superuser('admin@mail-domain.com', 'admin', 'password')
+
+    def get_user(self):
+        return get_user_model().objects.get(pk=self.user.pk)
+
+    def test_token_is_reused_across_user_instances(self):
+        tokens = self.get_user().token.tokens
+        self.assertEqual(self.get_user().token.tokens, tokens)
+
+    def test_token_is_reissued_when_token_payload_changes(self):
+        tokens = self.get_user().token.tokens
+        user = self.get_user()
+        user.first_name = 'John'
+        user.save(auto_hash_password=False)
+        self.assertNotEqual(self.get_user().token.tokens, tokens)
+
+    def test_token_is_not_reused_after_reissue_period_elapses(self):
+        token = self.get_user().token
+        # issued 31days(more than half of it's 60days validity period) ago
+        token.activation_date = datetime.now() - timedelta(days=31)
+        token.normal
+        self.assertEqual(len(User.issued_tokens_cache), 0)
+        token = self.get_user().token
+        token.normal
+        self.assertEqual(len(User.issued_tokens_cache), 1)
+
+    def test_reused_token_is_valid(self):
+        token = self.get_user().token
+        token.encrypted
+        reused = self.get_user().token
+        self.assertEqual(reused.get_payload(reused.encrypted).get('id'), self.user.pk)
+        self.assertEqual(reused.claims.get('nbf'), token.claims.get('nbf'))
+
+
+class CompactTokenPayloadTestCase(APITestCase):
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(
+            email='user@mail-domain.com',
+            username='user',
+            first_name='John',
+            last_name='Doe',
+            mobile_number='+254712345678',
+        )
+
+    def test_compact_token_payload_only_contains_id_version_and_flags(self):
+        payload = self.user.token_payload(compact=True)
+        self.assertEqual(set(payload.keys()), set(User.COMPACT_TOKEN_PAYLOAD_FIELDS + ('ver',)))
+        self.assertEqual(payload.get('id'), self.user.pk)
+        self.assertEqual(payload.get('ver'), User.COMPACT_TOKEN_PAYLOAD_VERSION)
+        self.assertIs(payload.get('is_active'), True)
+
+    def test_compact_token_is_smaller_than_full_token(self):
+        from xauth.utils.token import Token
+        compact = Token(self.user.token_payload(compact=True))
+        full = Token(self.user.token_payload(compact=False))
+        self.assertLess(len(compact.encrypted), len(full.encrypted))
+
+    def test_token_payload_defaults_to_configured_profile(self):
+        from unittest import mock
+        with mock.patch.object(User, '_User__COMPACT_TOKEN_PAYLOAD', True):
+            self.assertEqual(self.user.token_payload(), self.user.token_payload(compact=True))
+            self.assertEqual(self.user.token.payload, self.user.token_payload(compact=True))
+        self.assertEqual(self.user.token_payload(), self.user.token_payload(compact=False))
+
+    def test_compact_token_authenticates_user(self):
+        from xauth.authentication import BasicTokenAuthentication
+        from xauth.utils.token import Token
+        token = Token(self.user.token_payload(compact=True), subject='account-verification')
+        user = BasicTokenAuthentication().get_user_from_jwt_token(token.encrypted, 'http://testserver/')
+        self.assertEqual(user, self.user)
@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from xauth import authentication
+from xauth.utils import user_cache as user_cache_module
+from xauth.utils.cache import LocalCache
+from xauth.utils.user_cache import UserCache
+
+
+class UserCacheTestCase(APITestCase):
+
+    def setUp(self) -> None:
+        self.user_cache = UserCache(LocalCache(prefix='test'))
+        for target in [user_cache_module, authentication.BasicTokenAuthentication]:
+            patcher = mock.patch.object(target, 'user_cache', self.user_cache)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = get_user_model().objects.create_user(username='user', email='user@mail-domain.com', )
+        self.backend = authentication.BasicTokenAuthentication()
+        self.backend.claims_cache = None
+
+    def test_cached_user_is_retrieved_without_database_queries(self):
+        self.user_cache.get(self.user.pk)
+        with CaptureQueriesContext(connection) as queries:
+            user = self.user_cache.get(self.user.pk)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(user, self.user)
+        self.assertEqual(user.username, 'user')
+        self.assertIs(user.is_active, True)
+        self.assertEqual(self.user_cache.stats().get('hits'), 1)
+
+    def test_password_of_cached_user_is_loaded_on_access(self):
+        self.user_cache.get(self.user.pk)
+        user = self.user_cache.get(self.user.pk)
+        self.assertIn('password', user.get_deferred_fields())
+        self.assertEqual(user.password, get_user_model().objects.get(pk=self.user.pk).password)
+
+    def test_saving_user_invalidates_cached_user(self):
+        self.user_cache.get(self.user.pk)
+        self.user.first_name = 'John'
+        self.user.save(auto_hash_password=False)
+        self.assertEqual(self.user_cache.get(self.user.pk).first_name, 'John')
+
+    def test_saving_user_invalidates_users_cached_by_other_processes(self):
+        # shares versions(through the Django cache) but not projections with `self.user_cache`
+        other_process_cache = UserCache(LocalCache(prefix='test'))
+        other_process_cache.get(self.user.pk)
+        self.user.first_name = 'John'
+        self.user.save(auto_hash_password=False)
+        self.assertEqual(other_process_cache.get(self.user.pk).first_name, 'John')
+
+    def test_deleting_user_invalidates_cached_user(self):
+        pk = self.user.pk
+        self.user_cache.get(pk)
+        self.user.delete()
+        with self.assertRaises(get_user_model().DoesNotExist):
+            self.user_cache.get(pk)
+
+    def test_token_authentication_uses_user_cache(self):
+        from xauth.utils.token import Token
+        token = Token(self.user.token_payload()).encrypted
+        self.backend.get_user_from_jwt_token(token, 'http://testserver/')
+        with CaptureQueriesContext(connection) as queries:
+            user = self.backend.get_user_from_jwt_token(token, 'http://testserver/')
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(user, self.user)
@@ -25,4 +25,5 @@ urlpatterns = [
     path('security-question/add/', view=views.AddSecurityQuestionView.as_view(), name='security-question-add'),
     path('activation/request/', view=views.AccountActivationRequestView.as_view(), name='activation-request'),
     path(activation_ep, view=views.AccountActivationView.as_view(), name='activation-activate'),
+    path('.well-known/jwks.json', view=views.JWKSView.as_view(), name='jwks'),
 ]
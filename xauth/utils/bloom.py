@@ -0,0 +1,39 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Space efficient set membership test with no false negatives and a bounded rate of false positives
+
+    :param capacity: number of items the filter is sized for. The false positive rate grows beyond `error_rate`
+    once more items are added
+    :param error_rate: acceptable false positive rate(between 0 and 1) at `capacity`
+    """
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001):
+        capacity = max(1, int(capacity))
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._count = 0
+
+    def add(self, item: str):
+        for index in self._indices(item):
+            self._bits[index >> 3] |= 1 << (index & 7)
+        self._count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[index >> 3] & (1 << (index & 7)) for index in self._indices(item))
+
+    def __len__(self):
+        """number of items added. Duplicates are counted"""
+        return self._count
+
+    def _indices(self, item: str):
+        # double hashing(Kirsch-Mitzenmacher) with two 64-bit halves of a single digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
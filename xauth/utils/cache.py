@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class BaseCache:
+    """
+    Minimal cache interface shared by the caches used in xauth. Keeps track of hits and misses
+
+    :param prefix: prepended to every key to avoid collisions between caches sharing the same storage
+    """
+
+    def __init__(self, prefix: str = 'xauth'):
+        self.prefix = prefix
+        self._stats_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key, default=None):
+        value = self._get(self.make_key(key))
+        with self._stats_lock:
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return default if value is None else value
+
+    def set(self, key, value, timeout: float):
+        """
+        :param timeout: number of seconds `value` should be cached for. Values with a timeout of
+        zero or less are not cached
+        """
+        if timeout is not None and timeout <= 0:
+            return
+        self._set(self.make_key(key), value, timeout)
+
+    def delete(self, key):
+        self._delete(self.make_key(key))
+
+    def make_key(self, key):
+        return f'{self.prefix}:{key}'
+
+    def stats(self) -> dict:
+        """
+        :return: dict of `hits`, `misses` and `hit_rate`(a value between 0 and 1)
+        """
+        with self._stats_lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+            }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._hits = 0
+            self._misses = 0
+
+    def clear(self):
+        raise NotImplementedError
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, value, timeout):
+        raise NotImplementedError
+
+    def _delete(self, key):
+        raise NotImplementedError
+
+
+class LocalCache(BaseCache):
+    """
+    Bounded per-process LRU cache whose entries expire after their timeout
+
+    :param max_size: maximum number of entries. The least recently used entry is evicted when exceeded
+    """
+
+    def __init__(self, prefix: str = 'xauth', max_size: int = 10000):
+        super().__init__(prefix=prefix)
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expiry, value = entry
+            if expiry is not None and expiry <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def _set(self, key, value, timeout):
+        expiry = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._data[key] = (expiry, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def _delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class DjangoCache(BaseCache):
+    """
+    Stores entries in one of the caches configured in `settings.CACHES` and is therefore
+    shared across worker processes(depending on the cache backend)
+
+    :param alias: name of the cache in `settings.CACHES`
+    """
+
+    def __init__(self, prefix: str = 'xauth', alias: str = 'default'):
+        super().__init__(prefix=prefix)
+        self.alias = alias
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def clear(self):
+        """
+        Not supported. Clearing only the entries under `prefix` is not possible with every cache backend and
+        clearing the whole cache would also remove entries(e.g. sessions) that do not belong to xauth
+
+        :raises NotImplementedError
+        """
+        raise NotImplementedError(f"clearing the shared '{self.alias}' cache is not supported")
+
+    def _get(self, key):
+        return self.cache.get(key)
+
+    def _set(self, key, value, timeout):
+        self.cache.set(key, value, timeout=timeout)
+
+    def _delete(self, key):
+        self.cache.delete(key)
+
+
+def get_cache(config, prefix: str):
+    """
+    Creates a cache from `config` e.g. {'BACKEND': 'local', 'MAX_SIZE': 10000, } or
+    {'BACKEND': 'django', 'CACHE_ALIAS': 'default', }
+
+    :param config: dict of cache options. None or an empty dict disables caching
+    :param prefix: see `BaseCache`
+    :return: `BaseCache` or None if caching is disabled
+    """
+    if not config:
+        return None
+    backend = str(config.get('BACKEND', 'local')).lower()
+    if backend == 'local':
+        return LocalCache(prefix=prefix, max_size=config.get('MAX_SIZE', 10000))
+    if backend == 'django':
+        return DjangoCache(prefix=prefix, alias=config.get('CACHE_ALIAS', 'default'))
+    raise ValueError(f"unknown cache backend '{backend}'. Expected one of ['local', 'django']")
@@ -0,0 +1,200 @@
+import json
+import os
+import struct
+import time
+import zlib
+
+from cryptography.exceptions import InvalidSignature, InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, padding
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.concatkdf import ConcatKDFHash
+from jwcrypto import jwe, jwk, jws, jwt
+from jwcrypto.common import base64url_decode, base64url_encode, json_encode
+
+
+class CompactTokenCodec:
+    """
+    Signs, verifies, encrypts and decrypts compact serialized tokens of the fixed header profiles issued by `Token`
+    (RS256 signed `JWT`s & ECDH-ES/A256GCM encrypted, optionally 'DEF' compressed, `JWT`s) with `cryptography`
+    directly instead of through jwcrypto's generic `jwt.JWT` & `jwk.JWK` machinery. Tokens are byte-for-byte the
+    same as the ones jwcrypto produces(ECDH-ES tokens differ only by their random ephemeral key & iv) and errors
+    are raised as the same jwcrypto exceptions. Tokens of any other profile are left to jwcrypto(see `can_sign` &
+    `can_encrypt`)
+    """
+    SIGNING_ALGORITHMS = ('RS256',)
+    ENCRYPTION_ALGORITHMS = (('ECDH-ES', 'A256GCM'),)
+    # header parameters of the supported profiles. Tokens with any other parameter(e.g. 'crit') are left to jwcrypto
+    SIGNING_HEADER_PARAMETERS = frozenset(['alg', 'typ', 'kid', ])
+    ENCRYPTION_HEADER_PARAMETERS = frozenset(['alg', 'enc', 'kid', 'epk', 'zip', ])
+    # compression algorithms of the 'zip' header. 'DEF' is raw DEFLATE(RFC 1951)
+    COMPRESSION_ALGORITHMS = ('DEF',)
+    # bytes a compressed plaintext may decompress to. Guards against decompression bombs
+    MAX_DECOMPRESSED_SIZE = 256 * 1024
+    CURVES = {'P-256': ec.SECP256R1, 'P-384': ec.SECP384R1, 'P-521': ec.SECP521R1, }
+    # seconds by which `exp` & `nbf` claims may be off. Same as jwcrypto's default
+    LEEWAY = 60
+
+    def __init__(self):
+        # base64url encoded signing headers by their parameters. A handful exist i.e. one per signing key
+        self._headers = {}
+        # `cryptography` key objects by (id of their `jwk.JWK`, operation). Creating them(especially RSA private keys)
+        # is what makes jwcrypto's per-token `jwk.JWK.get_op_key` calls costly
+        self._op_keys = {}
+
+    def can_sign(self, header: dict, key: jwk.JWK) -> bool:
+        """
+        :return: True if tokens with `header` can be signed(or verified) with `key` by this codec
+        """
+        return header.get('alg') in self.SIGNING_ALGORITHMS and header.keys() <= self.SIGNING_HEADER_PARAMETERS \
+            and header.get('typ', 'JWT') == 'JWT' and key.get('kty') == 'RSA'
+
+    def can_encrypt(self, header: dict, key: jwk.JWK) -> bool:
+        """
+        :return: True if tokens with `header` can be encrypted(or decrypted) with `key` by this codec
+        """
+        return (header.get('alg'), header.get('enc')) in self.ENCRYPTION_ALGORITHMS \
+            and header.keys() <= self.ENCRYPTION_HEADER_PARAMETERS and key.get('kty') == 'EC' \
+            and key.get('crv') in self.CURVES and header.get('zip', 'DEF') in self.COMPRESSION_ALGORITHMS
+
+    def sign(self, header: dict, claims: dict, key: jwk.JWK) -> str:
+        """
+        :param header: protected header. See `can_sign`
+        :param claims: `JWT` claims
+        :param key: private signing key
+        :return: compact serialized signed token
+        """
+        header_key = tuple(sorted(header.items()))
+        encoded_header = self._headers.get(header_key)
+        if encoded_header is None:
+            encoded_header = self._headers[header_key] = base64url_encode(json_encode(header))
+        signing_input = f'{encoded_header}.{base64url_encode(json_encode(claims))}'
+        signature = self._get_op_key(key, 'sign').sign(signing_input.encode(), padding.PKCS1v15(), hashes.SHA256())
+        return f'{signing_input}.{base64url_encode(signature)}'
+
+    def verify(self, token: str, key: jwk.JWK):
+        """
+        Verifies `token`'s signature and its `exp` & `nbf` claims
+
+        :param token: compact serialized signed token whose header `can_sign`
+        :param key: verification key
+        :return: `token`'s decoded claims
+        :raises jwcrypto.jws.InvalidJWSObject if `token` is malformed
+        :raises jwcrypto.jws.InvalidJWSSignature if the signature is invalid
+        :raises jwcrypto.jwt.JWTExpired, jwcrypto.jwt.JWTNotYetValid
+        """
+        parts = token.split('.')
+        if len(parts) != 3:
+            raise jws.InvalidJWSObject('malformed token')
+        try:
+            signature = base64url_decode(parts[2])
+        except ValueError as ex:
+            raise jws.InvalidJWSObject('malformed token', ex)
+        try:
+            self._get_op_key(key, 'verify').verify(signature, f'{parts[0]}.{parts[1]}'.encode(), padding.PKCS1v15(),
+                                                   hashes.SHA256())
+        except InvalidSignature as ex:
+            raise jws.InvalidJWSSignature('Verification failed', ex)
+        try:
+            claims = json.loads(base64url_decode(parts[1]))
+        except ValueError as ex:
+            raise jws.InvalidJWSObject('malformed token', ex)
+        if isinstance(claims, dict):
+            self._check_claims(claims)
+        return claims
+
+    def encrypt(self, header: dict, plaintext: str, key: jwk.JWK) -> str:
+        """
+        :param header: protected header without the ephemeral key('epk'). See `can_encrypt`
+        :param plaintext: e.g. a signed token. Compressed before encryption if `header` has a 'zip'
+        :param key: (public) encryption key
+        :return: compact serialized encrypted token
+        """
+        curve = self.CURVES[key['crv']]()
+        ephemeral_key = ec.generate_private_key(curve)
+        cek = self._derive_key(ephemeral_key, self._get_op_key(key, 'wrapKey'), header['enc'])
+        numbers, size = ephemeral_key.public_key().public_numbers(), (curve.key_size + 7) // 8
+        epk = {
+            'kty': 'EC',
+            'crv': key['crv'],
+            'x': base64url_encode(numbers.x.to_bytes(size, 'big')),
+            'y': base64url_encode(numbers.y.to_bytes(size, 'big')),
+        }
+        protected = base64url_encode(json_encode(dict(header, epk=epk)))
+        iv = os.urandom(12)
+        plaintext = plaintext.encode()
+        if 'zip' in header:
+            # raw DEFLATE i.e. without zlib's header & checksum. Same as jwcrypto
+            plaintext = zlib.compress(plaintext)[2:-4]
+        ciphertext = AESGCM(cek).encrypt(iv, plaintext, protected.encode())
+        # ECDH-ES(direct key agreement) has no encrypted key
+        return '.'.join([protected, '', base64url_encode(iv), base64url_encode(ciphertext[:-16]),
+                         base64url_encode(ciphertext[-16:]), ])
+
+    def decrypt(self, token: str, header: dict, key: jwk.JWK) -> str:
+        """
+        :param token: compact serialized encrypted token
+        :param header: `token`'s decoded protected header. See `can_encrypt`
+        :param key: private encryption key
+        :return: decrypted plaintext e.g. a signed token
+        :raises jwcrypto.jwe.InvalidJWEData if `token` is malformed or cannot be decrypted with `key`
+        """
+        parts = token.split('.')
+        if len(parts) != 5 or parts[1]:
+            raise jwe.InvalidJWEData('malformed token')
+        try:
+            epk = header['epk']
+            if epk['kty'] != 'EC' or epk['crv'] != key['crv']:
+                raise ValueError(f"unsupported ephemeral key {epk['kty']}/{epk['crv']}")
+            public_key = ec.EllipticCurvePublicNumbers(int.from_bytes(base64url_decode(epk['x']), 'big'),
+                                                       int.from_bytes(base64url_decode(epk['y']), 'big'),
+                                                       self.CURVES[epk['crv']]()).public_key()
+            iv, ciphertext, tag = (base64url_decode(part) for part in parts[2:])
+        except (KeyError, TypeError, ValueError) as ex:
+            raise jwe.InvalidJWEData('malformed token', ex)
+        cek = self._derive_key(self._get_op_key(key, 'unwrapKey'), public_key, header['enc'])
+        try:
+            plaintext = AESGCM(cek).decrypt(iv, ciphertext + tag, parts[0].encode())
+        except (InvalidTag, ValueError) as ex:
+            raise jwe.InvalidJWEData('Decryption failed', ex)
+        try:
+            if 'zip' in header:
+                plaintext = self._decompress(plaintext)
+            return plaintext.decode()
+        except (zlib.error, ValueError) as ex:
+            raise jwe.InvalidJWEData('malformed plaintext', ex)
+
+    def _decompress(self, data: bytes) -> bytes:
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        plaintext = decompressor.decompress(data, self.MAX_DECOMPRESSED_SIZE)
+        if decompressor.unconsumed_tail:
+            raise ValueError(f'plaintext is larger than {self.MAX_DECOMPRESSED_SIZE} bytes')
+        return plaintext
+
+    def _get_op_key(self, key: jwk.JWK, operation: str):
+        op_key_id = id(key), operation
+        entry = self._op_keys.get(op_key_id)
+        # `key` is compared in case the id was reused by a new key after the previous one was discarded
+        if entry is None or entry[0] is not key:
+            entry = self._op_keys[op_key_id] = key, key.get_op_key(operation)
+        return entry[1]
+
+    @staticmethod
+    def _derive_key(private_key, public_key, encryption: str) -> bytes:
+        """
+        :return: 256-bit content encryption key agreed on by ECDH-ES(RFC 7518 section 4.6) with empty 'apu' & 'apv'
+        """
+        algorithm = encryption.encode()
+        other_info = struct.pack('>I', len(algorithm)) + algorithm + struct.pack('>III', 0, 0, 256)
+        return ConcatKDFHash(algorithm=hashes.SHA256(), length=32, otherinfo=other_info).derive(
+            private_key.exchange(ec.ECDH(), public_key))
+
+    def _check_claims(self, claims: dict):
+        now = time.time()
+        for name in ('exp', 'nbf',):
+            if name in claims and not isinstance(claims[name], int):
+                raise jwt.JWTInvalidClaimValue(f"Claim {name} is not an integer")
+        if 'exp' in claims and claims['exp'] < now - self.LEEWAY:
+            raise jwt.JWTExpired('Expired at %d, time: %d(leeway: %d)' % (claims['exp'], now, self.LEEWAY))
+        if 'nbf' in claims and claims['nbf'] > now + self.LEEWAY:
+            raise jwt.JWTNotYetValid('Valid from %d, time: %d(leeway: %d)' % (claims['nbf'], now, self.LEEWAY))
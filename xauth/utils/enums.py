@@ -14,3 +14,10 @@ class AuthProvider(Enum):
 class PasswordResetType(Enum):
     CHANGE = auto()
     RESET = auto()
+
+
+class TokenType(Enum):
+    """Values of `XAUTH['RETURN_TOKEN_TYPE']`"""
+    BOTH = 0
+    ENCRYPTED = 1
+    NORMAL = 2
@@ -0,0 +1,171 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import hashers
+from django.utils.crypto import constant_time_compare, get_random_string, salted_hmac
+from rest_framework import exceptions, status
+
+from .settings import XAUTH
+
+
+class HashingUnavailable(exceptions.APIException):
+    """
+    Raised when the `HashingExecutor` is saturated. Responded to with a 503 and a `Retry-After: wait` header
+    """
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'server is busy, retry later'
+    default_code = 'hashing_unavailable'
+
+    def __init__(self, wait: int, detail=None, code=None):
+        super().__init__(detail, code)
+        self.wait = wait
+
+
+class HashingExecutor:
+    """
+    Runs password hashing & verification on a bounded pool of threads so that a burst of sign-ins cannot pin
+    every request thread on(deliberately slow) hashing. Argon2 & bcrypt release the GIL while hashing, leaving the
+    remaining threads free to serve cheap requests. Once `max_workers` hashes are running and `max_queue` more are
+    waiting, further hashes fail fast with `HashingUnavailable` instead of queueing up
+
+    :param max_workers: maximum number of concurrent hashes
+    :param max_queue: maximum number of hashes waiting for a free worker
+    :param retry_after: seconds clients are asked to wait(`Retry-After`) before retrying a rejected request
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 16, retry_after: int = 1):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='xauth-hashing')
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._rejected = 0
+
+    @classmethod
+    def from_settings(cls, config):
+        """
+        :param config: dict of 'MAX_WORKERS', 'MAX_QUEUE' and 'RETRY_AFTER'. None hashes on the calling thread
+        :return: `HashingExecutor` or None if disabled
+        """
+        if not config:
+            return None
+        return cls(max_workers=config.get('MAX_WORKERS', 4), max_queue=config.get('MAX_QUEUE', 16),
+                   retry_after=config.get('RETRY_AFTER', 1))
+
+    @property
+    def queue_depth(self) -> int:
+        """number of hashes waiting for a free worker"""
+        return self._queued
+
+    def stats(self) -> dict:
+        """
+        :return: dict of `queue_depth`, `running` and `rejected`(total number of hashes that failed fast)
+        """
+        with self._lock:
+            return {
+                'queue_depth': self._queued,
+                'running': self._running,
+                'rejected': self._rejected,
+            }
+
+    def run(self, fn, *args):
+        """
+        Runs `fn(*args)` on the pool and waits for its result
+
+        :raises HashingUnavailable if `max_workers` + `max_queue` hashes are already in progress
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HashingUnavailable(self.retry_after)
+        with self._lock:
+            self._queued += 1
+        try:
+            return self._executor.submit(self._call, fn, args).result()
+        finally:
+            self._slots.release()
+
+    def _call(self, fn, args):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+
+# algorithm(prefix) of hashes made by `make_code`
+CODE_ALGORITHM = 'hmac_sha256'
+
+
+# shared by every password & code hash of the process. None if disabled
+hashing_executor = HashingExecutor.from_settings(XAUTH.get('PASSWORD_HASHING'))
+
+
+def make_password(password, salt=None, hasher='default') -> str:
+    """
+    Same as `django.contrib.auth.hashers.make_password` but hashes on the `hashing_executor`(if enabled)
+
+    :raises HashingUnavailable if the `hashing_executor` is saturated
+    """
+    executor = hashing_executor
+    if executor is None or password is None:
+        return hashers.make_password(password, salt, hasher)
+    return executor.run(hashers.make_password, password, salt, hasher)
+
+
+def check_password(password, encoded, setter=None, preferred='default') -> bool:
+    """
+    Same as `django.contrib.auth.hashers.check_password` but verifies on the `hashing_executor`(if enabled).
+    `setter`(e.g. saving an upgraded hash) is still called on the calling thread
+
+    :raises HashingUnavailable if the `hashing_executor` is saturated
+    """
+    executor = hashing_executor
+    if executor is None or password is None or not hashers.is_password_usable(encoded):
+        return hashers.check_password(password, encoded, setter, preferred)
+    updated = []
+    correct = executor.run(hashers.check_password, password, encoded, updated.append if setter else None, preferred)
+    if updated:
+        setter(updated[0])
+    return correct
+
+
+def make_code(raw_code) -> str:
+    """
+    Hashes a short-lived secret(verification code or temporary password) as 'hmac_sha256$<salt>$<digest>' i.e. an
+    HMAC-SHA256 keyed with the `SECRET_KEY` over a random per-hash salt and `raw_code`. Unlike password hashers, this
+    takes microseconds. The secrets expire within the hour and their verification is rate-limited, so the `SECRET_KEY`
+    rather than a slow hash is what keeps a leaked hash from being brute-forced
+
+    :param raw_code: code to hash
+    :return: hashed `raw_code`
+    """
+    salt = get_random_string(16)
+    return f'{CODE_ALGORITHM}${salt}${_get_code_digest(salt, raw_code)}'
+
+
+def check_code(raw_code, encoded) -> bool:
+    """
+    :param raw_code: code to verify
+    :param encoded: hash made by `make_code` or, for codes issued before it, by `make_password`
+    :return: True if `raw_code` matches `encoded`
+    :raises HashingUnavailable if `encoded` is a password hash and the `hashing_executor` is saturated
+    """
+    if raw_code is None or encoded is None:
+        return False
+    algorithm, _, rest = encoded.partition('$')
+    if algorithm != CODE_ALGORITHM:
+        # legacy password hash. Verified until it expires
+        return check_password(raw_code, encoded)
+    salt, _, digest = rest.partition('$')
+    return constant_time_compare(digest, _get_code_digest(salt, raw_code))
+
+
+def _get_code_digest(salt: str, raw_code) -> str:
+    return salted_hmac('xauth.utils.hashing.code', f'{salt}${raw_code}', algorithm='sha256').hexdigest()
@@ -0,0 +1,89 @@
+import os
+import threading
+
+
+class KeyRing:
+    """
+    Process-wide cache of parsed `jwk.JWK` keys read from key files(`.pem`, `.txt`).
+
+    Keys are cached per (algorithm, purpose, year) and parsed only once. An entry is considered stale(and is
+    therefore re-read) whenever the backing file's path, inode, size or modification time changes so that keys
+    rotated on disk are still picked up without a restart.
+
+    Keys loaded with a `key_id` are also indexed by (algorithm, purpose, key id) for constant time lookups
+    with `find`(e.g. by the `kid` header of a token)
+    """
+
+    def __init__(self):
+        self._keys = {}
+        # (algorithm, purpose, key id) -> ring key
+        self._ids = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, ring_key: tuple, file: str, loader, password=None, key_id=None):
+        """
+        Gets and returns the key cached with `ring_key` or loads(and caches) a new one with `loader`
+        if the cached key is missing or stale
+
+        :raises FileNotFoundError if `file` does not exist
+        :param ring_key: tuple of (algorithm, purpose, year)
+        :param file: path to the key file
+        :param loader: callable accepting `file` as its only argument and returning a `jwk.JWK`
+        :param password: password used to unwrap the key. A cached key is only reused for the same password
+        :param key_id: callable accepting the loaded key and returning its id. The key is only indexed if provided
+        :return: `jwk.JWK`
+        """
+        stat = os.stat(file)
+        fingerprint = (file, stat.st_ino, stat.st_size, stat.st_mtime_ns, hash(password))
+        entry = self._keys.get(ring_key)
+        if entry is not None and entry[0] == fingerprint:
+            with self._lock:
+                self._hits += 1
+            return entry[1]
+        key = loader(file)
+        kid = key_id(key) if key_id else None
+        with self._lock:
+            self._keys[ring_key] = (fingerprint, key, kid)
+            if kid is not None:
+                self._ids[(ring_key[0], ring_key[1], kid)] = ring_key
+            self._misses += 1
+        return key
+
+    def find(self, algorithm: str, purpose: str, key_id):
+        """
+        :param key_id: id of a key loaded(with `get`) under a ring key of `algorithm` and `purpose`
+        :return: tuple of (ring key, key) or None if no such key was loaded
+        """
+        ring_key = self._ids.get((algorithm, purpose, key_id))
+        entry = self._keys.get(ring_key)
+        if entry is None or entry[2] != key_id:
+            # never loaded or replaced by a different key since
+            return None
+        return ring_key, entry[1]
+
+    def clear(self):
+        """Removes all cached keys and resets the hit/miss counters"""
+        with self._lock:
+            self._keys.clear()
+            self._ids.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def stats(self) -> dict:
+        """
+        :return: dict of `hits`, `misses` and `size`(number of cached keys)
+        """
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses, 'size': len(self._keys), }
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, ring_key):
+        return ring_key in self._keys
+
+
+# shared by every `TokenKey` in the process
+key_ring = KeyRing()
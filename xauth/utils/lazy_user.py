@@ -0,0 +1,53 @@
+from django.utils.functional import SimpleLazyObject, empty
+
+
+class LazyTokenUser(SimpleLazyObject):
+    """
+    Stands in for the user referred to by a verified token. Attributes found in the token's payload(e.g. `id`,
+    `is_active`, `is_superuser` with a compact token payload) are served from the payload while the user is only
+    fetched(with `loader`) once any other attribute is accessed.
+
+    Attributes assigned before the user is fetched(e.g. `device_ip`) are kept and applied to the fetched user.
+
+    N/B: values served from the payload are as fresh as the token is i.e. changes to them(e.g. deactivation)
+    only take effect once the user is fetched or a new token is issued
+
+    :param payload: verified token payload. Must contain the user's `id`
+    :param loader: callable accepting the user's `id` and returning the user
+    """
+    ALWAYS_AVAILABLE_ATTRIBUTES = {
+        'is_authenticated': True,
+        'is_anonymous': False,
+    }
+
+    def __init__(self, payload: dict, loader):
+        self.__dict__['_payload'] = dict(payload, pk=payload['id'], **self.ALWAYS_AVAILABLE_ATTRIBUTES)
+        self.__dict__['_assigned'] = {}
+        super().__init__(lambda: self.__load(loader))
+
+    @property
+    def is_loaded(self) -> bool:
+        """True if the user was fetched"""
+        return self._wrapped is not empty
+
+    def __getattr__(self, name):
+        if self._wrapped is empty:
+            assigned = self.__dict__['_assigned']
+            if name in assigned:
+                return assigned[name]
+            payload = self.__dict__['_payload']
+            if name in payload:
+                return payload[name]
+        return super().__getattr__(name)
+
+    def __setattr__(self, name, value):
+        if name in ('_wrapped', '_setupfunc') or self._wrapped is not empty:
+            super().__setattr__(name, value)
+        else:
+            self.__dict__['_assigned'][name] = value
+
+    def __load(self, loader):
+        user = loader(self.__dict__['_payload']['id'])
+        for name, value in self.__dict__['_assigned'].items():
+            setattr(user, name, value)
+        return user
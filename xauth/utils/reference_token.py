@@ -0,0 +1,150 @@
+import hashlib
+import json
+import secrets
+import time
+
+from jwcrypto import jwe, jwt
+
+from .cache import DjangoCache
+from .settings import XAUTH
+from .token import Token
+
+
+class ReferenceToken(Token):
+    """
+    Opaque alternative to (signed & encrypted) `Token`s. A reference token is a random 256-bit value that refers
+    to a record of its claims kept in the Django cache(`cache_alias`) with the database as a fallback. Only a
+    digest of the token is stored server-side.
+
+    Verification is therefore a single cache lookup(instead of decryption and signature verification) and a
+    token stops working as soon as it is revoked. Only suitable where the token issuer is also the token verifier
+    since its claims cannot be read without the record.
+
+    `normal` and `encrypted` refer to the same token. See `Token` for parameters
+    """
+    # name of the cache in `settings.CACHES` holding the records. Should be shared by all worker processes
+    cache_alias = XAUTH.get('REFERENCE_TOKEN_CACHE_ALIAS', 'default')
+    # cached in place of the claims of revoked tokens
+    REVOKED = 'revoked'
+
+    @property
+    def normal(self):
+        """
+        :return: reference token. The token(and its record) is only created on first access
+        """
+        if self._normal is None:
+            self._normal = self._encrypted = self._make_reference_token()
+            self._issued()
+        return self._normal
+
+    @property
+    def encrypted(self):
+        return self.normal
+
+    @classmethod
+    def issue_many(cls, users, subject: str = None, expiry=None, processes: int = None, chunk_size: int = 100):
+        """
+        Same as `Token.issue_many` but always issues tokens in the current process(`processes` is ignored).
+        Issuing a reference token is a database write, which forked workers would make over the database
+        connection they share with the current process, while there is nothing costly to spread across processes
+        """
+        return super().issue_many(users, subject=subject, expiry=expiry, processes=1, chunk_size=chunk_size)
+
+    @property
+    def cache(self):
+        return DjangoCache(prefix='xauth:ref', alias=self.cache_alias)
+
+    @staticmethod
+    def is_reference_token(token) -> bool:
+        """
+        :return: True if `token` is not a(compact serialized) JWT
+        """
+        token = token.decode() if isinstance(token, bytes) else token
+        return isinstance(token, str) and '.' not in token
+
+    @staticmethod
+    def get_digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get_claims(self, token=None, encrypted: bool = True):
+        """
+        :raises jwcrypto.jwe.JWException if `token` is unknown or was revoked
+        :raises jwcrypto.jwt.JWTExpired, jwcrypto.jwt.JWTNotYetValid
+        :param encrypted: ignored
+        :return: dict of claims `token` was issued with
+        """
+        token = self.normal if not token else token
+        token = token.decode() if isinstance(token, bytes) else token
+        digest = self.get_digest(token)
+        cache = self.cache
+        claims = cache.get(digest)
+        if claims is None:
+            from xauth.models import ReferenceTokenRecord
+            record = ReferenceTokenRecord.objects.filter(digest=digest).first()
+            if record is None:
+                raise jwe.JWException('unknown or revoked token')
+            claims = json.loads(record.claims)
+            # `add` never replaces the marker of a token revoked after its record was read
+            cache.cache.add(cache.make_key(digest), claims, timeout=max(1, int(claims['exp'] - time.time())))
+        if claims == self.REVOKED:
+            raise jwe.JWException('unknown or revoked token')
+        now = time.time()
+        if claims['exp'] <= now:
+            raise jwt.JWTExpired(f"expired at {claims['exp']}")
+        if claims['nbf'] > now:
+            raise jwt.JWTNotYetValid(f"valid from {claims['nbf']}")
+        return claims
+
+    @classmethod
+    def is_revoked(cls, token) -> bool:
+        try:
+            cls(None).get_claims(token)
+        except jwe.JWException:
+            return True
+        return False
+
+    def revoke(self, token=None, encrypted: bool = True):
+        """
+        Deletes the record of `token`(defaults to `normal`) thereby invalidating it immediately
+
+        :param encrypted: ignored
+        """
+        from xauth.models import ReferenceTokenRecord
+        token = self.normal if not token else token
+        token = token.decode() if isinstance(token, bytes) else token
+        digest = self.get_digest(token)
+        records = ReferenceTokenRecord.objects.filter(digest=digest)
+        exp = records.values_list('exp', flat=True).first()
+        records.delete()
+        if exp is None:
+            self.cache.delete(digest)
+        else:
+            # marks the token as revoked in all worker processes until it would have expired anyway
+            self.cache.set(digest, self.REVOKED, exp - time.time())
+
+    @staticmethod
+    def purge_expired() -> int:
+        """
+        Deletes records of expired tokens from the database
+        :return: number of records deleted
+        """
+        from xauth.models import ReferenceTokenRecord
+        deleted, _ = ReferenceTokenRecord.objects.filter(exp__lte=int(time.time())).delete()
+        return deleted
+
+    def _make_reference_token(self):
+        from xauth.models import ReferenceTokenRecord
+        token = secrets.token_urlsafe(32)
+        digest, claims = self.get_digest(token), self.claims
+        ReferenceTokenRecord.objects.create(digest=digest, claims=json.dumps(claims), exp=claims['exp'])
+        self.cache.set(digest, claims, claims['exp'] - time.time())
+        return token
+
+
+def get_token_class(token_format: str = None):
+    """
+    :param token_format: either 'jwt' or 'reference'. Defaults to `XAUTH['TOKEN_FORMAT']`
+    :return: `Token` or `ReferenceToken`
+    """
+    token_format = str(XAUTH.get('TOKEN_FORMAT', 'jwt') if token_format is None else token_format).lower()
+    return ReferenceToken if token_format == 'reference' else Token
@@ -0,0 +1,111 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .bloom import BloomFilter
+from .settings import XAUTH
+
+
+class RevocationList:
+    """
+    Keeps track of revoked tokens by their `jti` claim. Revocations are stored in the database(`RevokedToken`)
+    with a per-process `BloomFilter` in front so that checking a token that was not revoked(i.e. most of them)
+    never queries the database. Only tokens the filter reports as(possibly) revoked are looked up.
+
+    The filter is updated with revocations made by other processes every `sync_interval` seconds and rebuilt from
+    unexpired revocations every `rebuild_interval` seconds(or once it is full). Revocations made by the current
+    process take effect immediately
+
+    :param capacity: minimum number of revocations the filter is sized for
+    :param error_rate: the filter's false positive rate i.e. fraction of lookups of tokens that were not revoked
+    that query the database
+    :param sync_interval: maximum number of seconds a revocation by another process goes unnoticed
+    :param rebuild_interval: number of seconds after which the filter is rebuilt to drop expired revocations
+    """
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001, sync_interval: float = 10,
+                 rebuild_interval: float = 3600):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._next_sync = 0
+        self._next_rebuild = 0
+        self._synced_at = None
+
+    @classmethod
+    def from_settings(cls, config):
+        """
+        :param config: dict of 'CAPACITY', 'ERROR_RATE', 'SYNC_INTERVAL' and 'REBUILD_INTERVAL'. None or an empty
+        dict disables revocation
+        :return: `RevocationList` or None if revocation is disabled
+        """
+        if not config:
+            return None
+        return cls(capacity=config.get('CAPACITY', 100000), error_rate=config.get('ERROR_RATE', 0.001),
+                   sync_interval=config.get('SYNC_INTERVAL', 10), rebuild_interval=config.get('REBUILD_INTERVAL', 3600))
+
+    def is_revoked(self, jti) -> bool:
+        if not jti:
+            return False
+        self._sync_if_due()
+        if jti not in self._bloom:
+            return False
+        from xauth.models import RevokedToken
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def revoke(self, jti, exp: int):
+        """
+        :param jti: id of the revoked token
+        :param exp: token's expiry time in seconds since the epoch. The revocation is kept until then
+        """
+        from xauth.models import RevokedToken
+        RevokedToken.objects.get_or_create(jti=jti, defaults={'exp': int(exp), })
+        self._sync_if_due()
+        if jti not in self._bloom:
+            self._bloom.add(jti)
+
+    def sync(self, rebuild: bool = False):
+        """
+        Adds revocations made since the last sync to the filter or rebuilds the filter from all unexpired
+        revocations if `rebuild` is True
+        """
+        from xauth.models import RevokedToken
+        now, monotonic = timezone.now(), time.monotonic()
+        with self._lock:
+            if rebuild or self._bloom is None or len(self._bloom) >= self._bloom.capacity:
+                revocations = RevokedToken.objects.filter(exp__gt=int(time.time()))
+                bloom = BloomFilter(max(self.capacity, 2 * revocations.count()), self.error_rate)
+                self._next_rebuild = monotonic + self.rebuild_interval
+            else:
+                # overlaps the previous sync to include revocations committed late
+                since = self._synced_at - timedelta(seconds=max(self.sync_interval, 1))
+                revocations, bloom = RevokedToken.objects.filter(revoked_at__gte=since), self._bloom
+            for jti in revocations.values_list('jti', flat=True).iterator():
+                if jti not in bloom:
+                    bloom.add(jti)
+            self._bloom, self._synced_at = bloom, now
+            self._next_sync = monotonic + self.sync_interval
+
+    @staticmethod
+    def purge_expired() -> int:
+        """
+        Deletes revocations of expired tokens from the database
+        :return: number of revocations deleted
+        """
+        from xauth.models import RevokedToken
+        deleted, _ = RevokedToken.objects.filter(exp__lte=int(time.time())).delete()
+        return deleted
+
+    def _sync_if_due(self):
+        monotonic = time.monotonic()
+        if self._bloom is None or monotonic >= self._next_sync:
+            self.sync(rebuild=monotonic >= self._next_rebuild)
+
+
+# shared by authentication & token revocation. None if disabled(the default)
+revocation_list = RevocationList.from_settings(XAUTH.get('TOKEN_REVOCATION', None))
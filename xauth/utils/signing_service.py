@@ -0,0 +1,277 @@
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+
+
+class SigningServiceError(Exception):
+    """raised when the signing service fails to issue a token it was asked for"""
+
+
+class SigningService:
+    """
+    Local service that signs & encrypts tokens on behalf of web workers. It listens on the Unix domain socket `path`
+    and is the only process that loads the private signing keys. Requests are newline delimited JSON
+    objects with either the `claims` to sign or an already signed `normal` token(to be encrypted) and are answered
+    with a JSON object of the `normal` and(if `encrypt` was requested) `encrypted` tokens or an `error`.
+
+    Requests of concurrent connections are queued and issued, in order of arrival, by a pool of `workers` threads.
+    Once `max_queue` requests are waiting, further requests are answered with an `error` right away and requests
+    whose client stopped waiting(their `deadline` passed) are dropped instead of issued. Clients fall back to
+    issuing tokens themselves in either case(see `SigningClient`). Start it with
+    `python manage.py xauth_signing_service` or in-process(e.g. in tests) with::
+
+        with SigningService(path):
+            ...
+
+    :param path: file system path of the Unix domain socket. Replaced if it exists
+    :param workers: number of threads issuing tokens
+    :param max_queue: maximum number of requests waiting for a free worker
+    :param token_class: `Token` class tokens are issued with. Defaults to `xauth.utils.token.Token`
+    """
+
+    def __init__(self, path: str, workers: int = 4, max_queue: int = 256, token_class=None):
+        self.path = path
+        self.workers = max(1, workers)
+        self.token_class = token_class
+        self._queue = queue.Queue(maxsize=max(1, max_queue))
+        self._tokens = {}
+        self._server = None
+        self._threads = []
+        self._connections = set()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        """
+        Starts listening and issuing tokens in background threads
+        :return: self
+        """
+        self._listen()
+        self._start_thread(self._server.serve_forever)
+        return self
+
+    def serve_forever(self):
+        """
+        Listens and issues tokens until interrupted(e.g. by `KeyboardInterrupt`)
+        """
+        self._listen()
+        try:
+            self._server.serve_forever()
+        finally:
+            self.stop()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for connection in list(self._connections):
+            # unblocks handlers waiting for requests of connected clients
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for _ in range(self.workers):
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def submit(self, request: dict) -> Future:
+        """
+        Queues `request` for issuance
+        :return: `Future` of the response. Resolved with an `error` right away if `max_queue` requests are waiting
+        """
+        future = Future()
+        try:
+            self._queue.put_nowait((request, future))
+        except queue.Full:
+            future.set_result({'error': f'busy: {self._queue.maxsize} requests are already waiting', })
+        return future
+
+    def _listen(self):
+        if os.path.exists(self.path):
+            # left behind by a previous run
+            os.remove(self.path)
+        service = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def setup(self):
+                super().setup()
+                service._connections.add(self.connection)
+
+            def finish(self):
+                service._connections.discard(self.connection)
+                try:
+                    super().finish()
+                except OSError:
+                    pass
+
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        response = service.submit(json.loads(line)).result()
+                    except ValueError as ex:
+                        response = {'error': f'malformed request: {ex}', }
+                    self.wfile.write(json.dumps(response).encode() + b'\n')
+
+        server = socketserver.ThreadingUnixStreamServer(self.path, Handler, bind_and_activate=False)
+        server.daemon_threads = True
+        try:
+            server.server_bind()
+            # only processes of the same user may have tokens signed
+            os.chmod(self.path, 0o600)
+            server.server_activate()
+        except OSError:
+            server.server_close()
+            raise
+        self._server = server
+        for _ in range(self.workers):
+            self._start_thread(self._issue_requests)
+
+    def _start_thread(self, target):
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _issue_requests(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            request, future = item
+            deadline = request.get('deadline')
+            if isinstance(deadline, (int, float)) and deadline < time.time():
+                # the client stopped waiting(and may have issued the tokens itself)
+                future.set_result({'error': 'expired: the client stopped waiting for the response', })
+                continue
+            try:
+                response = self._issue(request)
+            except Exception as ex:
+                response = {'error': f'{type(ex).__name__}: {ex}', }
+            future.set_result(response)
+
+    def _issue(self, request: dict) -> dict:
+        algorithms = request.get('signing_algorithm'), request.get('encryption_algorithm')
+        token = self._tokens.get(algorithms)
+        if token is None:
+            token_class = self.token_class or self._get_default_token_class()
+            if algorithms[0] not in token_class.ALLOWED_SIGNING_ALGORITHMS or \
+                    algorithms[1] not in token_class.ALLOWED_ENCRYPTION_ALGORITHMS:
+                raise SigningServiceError(f'unsupported algorithms {algorithms}')
+            token = self._tokens[algorithms] = token_class(None, signing_algorithm=algorithms[0],
+                                                           encryption_algorithm=algorithms[1])
+        normal = request.get('normal')
+        if normal is None:
+            normal = token._make_signed_token(request['claims'])
+        response = {'normal': normal, }
+        if request.get('encrypt'):
+            response['encrypted'] = token._make_encrypted_token(normal)
+        return response
+
+    @staticmethod
+    def _get_default_token_class():
+        from .token import Token
+        return Token
+
+
+class SigningClient:
+    """
+    Issues tokens through a `SigningService`. Each thread keeps its own connection to the service
+
+    :param path: file system path of the service's Unix domain socket
+    :param timeout: seconds after which connecting to or waiting for the service fails with `socket.timeout`.
+    Requests that are still queued by then are dropped by the service
+    :param fallback: if True, `Token`s are signed locally while the service is unreachable or fails to issue them
+    (e.g. it is busy or cannot load its keys)
+    """
+
+    def __init__(self, path: str, timeout: float = 5, fallback: bool = True):
+        self.path = path
+        self.timeout = timeout
+        self.fallback = fallback
+        self._local = threading.local()
+
+    @classmethod
+    def from_settings(cls, config):
+        """
+        :param config: dict of 'SOCKET', 'TIMEOUT' and 'FALLBACK'. None disables the signing service
+        :return: `SigningClient` or None if the signing service is disabled
+        """
+        if not config:
+            return None
+        return cls(config['SOCKET'], timeout=config.get('TIMEOUT', 5), fallback=config.get('FALLBACK', True))
+
+    def issue(self, signing_algorithm: str, encryption_algorithm: str, claims: dict = None, normal: str = None,
+              encrypt: bool = True) -> dict:
+        """
+        :param claims: claims to be signed. Ignored if `normal` is provided
+        :param normal: already signed token to be encrypted
+        :param encrypt: if True, the signed token is also encrypted
+        :return: dict of the `normal` and(if `encrypt` is True) `encrypted` tokens
+        :raises OSError if the service is unreachable
+        :raises SigningServiceError if the service failed to issue the tokens
+        """
+        request = {
+            'signing_algorithm': signing_algorithm,
+            'encryption_algorithm': encryption_algorithm,
+            'encrypt': encrypt,
+            'deadline': time.time() + self.timeout,
+        }
+        if normal is None:
+            request['claims'] = claims
+        else:
+            request['normal'] = normal
+        request = json.dumps(request).encode() + b'\n'
+        reused = getattr(self._local, 'connection', None) is not None
+        try:
+            response = self._request(request)
+        except ConnectionError:
+            if not reused:
+                raise
+            # the connection was closed since it was last used e.g. by a restart of the service
+            response = self._request(request)
+        response = json.loads(response)
+        if 'error' in response:
+            raise SigningServiceError(response['error'])
+        return response
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            self._local.connection = None
+            connection[1].close()
+            connection[0].close()
+
+    def _request(self, request: bytes) -> bytes:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            connection = self._local.connection = sock, sock.makefile('rb')
+        try:
+            connection[0].sendall(request)
+            response = connection[1].readline()
+        except OSError:
+            self.close()
+            raise
+        if not response:
+            self.close()
+            raise ConnectionResetError('signing service closed the connection')
+        return response
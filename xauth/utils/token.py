@@ -1,39 +1,250 @@
+import hashlib
+import hmac
+import itertools
 import json
+import multiprocessing
 import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import timedelta
 
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.utils.datetime_safe import datetime
 from django.utils.encoding import force_str
-from jwcrypto import jwk, jwt
-from jwcrypto.common import json_decode
+from jwcrypto import jwe, jwk, jws, jwt
+from jwcrypto.common import base64url_decode, base64url_encode, json_decode
+
+from . import revocation
+from .codec import CompactTokenCodec
+from .enums import TokenType
+from .keyring import key_ring
+from .signing_service import SigningClient, SigningServiceError
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
 
 # JWT_SIG_ALG = 'HS256'
-JWT_SIG_ALG = 'RS256'
+JWT_SIG_ALG = settings.XAUTH.get('TOKEN_SIGNING_ALGORITHM', 'RS256')
+JWT_ENC_ALG = settings.XAUTH.get('TOKEN_ENCRYPTION_ALGORITHM', 'ECDH-ES')
 
 
 class TokenKey:
     """
     :param password: for wrapping the private signing and encryption key(s) generated during `.pem` file creation
-    :param signing_algorithm: signing algorithm. Can either be 'RS256' or 'HS256'
+    :param signing_algorithm: signing algorithm. Can either be 'RS256', 'ES256', 'EdDSA'(Ed25519) or 'HS256'
+    :param encryption_algorithm: `JWE` key management algorithm. Can either be 'ECDH-ES', 'dir' or 'A256KW'.
+    'dir' & 'A256KW' use a stored 256-bit symmetric key and are only suitable where the token issuer is also
+    the token verifier
     """
-    ALLOWED_SIGNING_ALGORITHMS = ['RS256', 'HS256']
+    ALLOWED_SIGNING_ALGORITHMS = ['RS256', 'HS256', 'ES256', 'EdDSA']
+    # `jwk.JWK.generate` parameters of asymmetric signing keys
+    SIGNING_KEY_PARAMETERS = {
+        'RS256': {'kty': 'RSA', 'alg': 'RSA-OAEP', 'size': 2048, },
+        'ES256': {'kty': 'EC', 'crv': 'P-256', },
+        'EdDSA': {'kty': 'OKP', 'crv': 'Ed25519', },
+    }
+    ENCRYPTION_ALGORITHM = 'ECDH-ES'
+    SYMMETRIC_ENCRYPTION_ALGORITHMS = ['dir', 'A256KW']
+    ALLOWED_ENCRYPTION_ALGORITHMS = [ENCRYPTION_ALGORITHM] + SYMMETRIC_ENCRYPTION_ALGORITHMS
+
+    # process-wide cache of parsed keys. Prevents re-reading(and decrypting) `.pem` files on every key access
+    key_ring = key_ring
+    # keys are rotated yearly. RETAIN_PERIODS is the number of previous years whose keys still verify(and decrypt)
+    # tokens while keys of the next year are generated PREGENERATE_DAYS before it starts
+    KEY_ROTATION = dict({'RETAIN_PERIODS': 1, 'PREGENERATE_DAYS': 30, }, **settings.XAUTH.get('KEY_ROTATION', {}))
+    # if True, tokens are verified with the public signing keys i.e. the private signing keys are only loaded to
+    # sign tokens. See `Token.verifies_with_public_keys`
+    verifies_with_public_keys = False
+    # monotonic time after which a process next checks whether next year's keys are due for generation
+    _next_rotation_check = 0
 
     # Create a folder in the root directory of the project to hold generated keys
     # This directory should not be committed to version control
     KEYS_ROOT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))).replace('/xauth', ''),
                                   'xauth-secrets')
 
-    def __init__(self, password=settings.SECRET_KEY, signing_algorithm=JWT_SIG_ALG):
+    def __init__(self, password=settings.SECRET_KEY, signing_algorithm=JWT_SIG_ALG, encryption_algorithm=JWT_ENC_ALG):
         self.password = password.encode()
         assert (signing_algorithm in self.ALLOWED_SIGNING_ALGORITHMS), \
             f'{signing_algorithm} must be in {self.ALLOWED_SIGNING_ALGORITHMS}'
+        assert (encryption_algorithm in self.ALLOWED_ENCRYPTION_ALGORITHMS), \
+            f'{encryption_algorithm} must be in {self.ALLOWED_ENCRYPTION_ALGORITHMS}'
         self.signing_algorithm = signing_algorithm
+        self.encryption_algorithm = encryption_algorithm
 
     @property
     def encryption_key(self):
         # Generate an encryption key...
-        return self._get_jwt_signing_or_encryption_key(encryption=True)
+        return self.get_encryption_key(self.encryption_algorithm)
+
+    def get_encryption_key(self, algorithm: str, provision: bool = True, year: int = None) -> jwk.JWK:
+        """
+        :raises FileNotFoundError if the key does not exist and `provision` is False
+        :param algorithm: one of `ALLOWED_ENCRYPTION_ALGORITHMS`
+        :param provision: if True, the key is generated if it does not exist
+        :param year: year the key is used in. Defaults to the current year
+        :return: encryption key used with `algorithm`
+        """
+        if algorithm in self.SYMMETRIC_ENCRYPTION_ALGORITHMS:
+            return self._get_symmetric_encryption_key(algorithm, provision, year)
+        return self._get_jwt_signing_or_encryption_key(encryption=True, provision=provision, year=year)
+
+    def get_verification_key_by_id(self, key_id: str):
+        """
+        :param key_id: `kid` of a signing key of `signing_algorithm`
+        :return: `jwk.JWK` or None if the key does not exist or is retired
+        """
+        if self.signing_algorithm == 'HS256':
+            return self._get_key_by_id(self.signing_algorithm, 'sign', key_id,
+                                       lambda _: self._get_default_signing_key())
+        if self.verifies_with_public_keys:
+            # public keys share their id with their private key once `preload` derived them from it
+            return self._get_key_by_id(self.signing_algorithm, 'verify', key_id, lambda year: (
+                self._get_jwt_signing_or_encryption_key(private=False, provision=False, year=year)))
+        # tokens are verified with the private key(see `_jwt_signing_keys`) which shares its id with the public key
+        return self._get_key_by_id(self.signing_algorithm, 'sign', key_id, lambda year: (
+            self._get_jwt_signing_or_encryption_key(provision=False, year=year)))
+
+    def get_decryption_key_by_id(self, algorithm: str, key_id: str):
+        """
+        :param algorithm: one of `ALLOWED_ENCRYPTION_ALGORITHMS`
+        :param key_id: `kid` of an encryption key of `algorithm`
+        :return: `jwk.JWK` or None if the key does not exist or is retired
+        """
+        ring_algorithm = algorithm if algorithm in self.SYMMETRIC_ENCRYPTION_ALGORITHMS else self.ENCRYPTION_ALGORITHM
+        return self._get_key_by_id(ring_algorithm, 'encrypt', key_id, lambda year: (
+            self.get_encryption_key(algorithm, provision=False, year=year)))
+
+    def get_public_jwks(self) -> dict:
+        """
+        :return: JSON Web Key Set(RFC 7517) of the public keys that verify tokens signed with non-retired keys of
+        `signing_algorithm`. Empty for 'HS256' whose key is secret
+        """
+        keys = []
+        if self.signing_algorithm == 'HS256':
+            return {'keys': keys, }
+        current_year = datetime.now().year
+        for year in self.get_retained_years():
+            try:
+                key = self._get_jwt_signing_or_encryption_key(private=not self.verifies_with_public_keys,
+                                                              provision=year == current_year, year=year)
+            except FileNotFoundError:
+                continue
+            # public part of the private key that signs(and verifies) tokens. Public key files generated by
+            # earlier versions are not derived from their private key unless `preload` replaced them
+            public = json.loads(key.export_public())
+            public.pop('key_ops', None)
+            public.update({'kid': self.get_key_id(key), 'use': 'sig', 'alg': self.signing_algorithm, })
+            keys.append(public)
+        return {'keys': keys, }
+
+    def get_retained_years(self) -> range:
+        """
+        :return: years whose keys are not retired i.e. the current year, `KEY_ROTATION['RETAIN_PERIODS']`
+        years before it and the next year(whose keys may have been generated in advance)
+        """
+        year = datetime.now().year
+        return range(year - max(0, self.KEY_ROTATION['RETAIN_PERIODS']), year + 2)
+
+    def provision_next_year_keys(self) -> bool:
+        """
+        Generates(and loads into the `key_ring`) next year's signing & encryption keys once less than
+        `KEY_ROTATION['PREGENERATE_DAYS']` days are left to it so that the yearly rotation neither waits on key
+        generation nor invalidates tokens issued before it
+
+        :return: True if next year's keys exist(or were generated)
+        """
+        now = datetime.now()
+        next_year = now.year + 1
+        if datetime(next_year, 1, 1) - now > timedelta(days=self.KEY_ROTATION['PREGENERATE_DAYS']):
+            return False
+        if self.signing_algorithm != 'HS256':
+            self._get_jwt_signing_or_encryption_key(private=True, year=next_year)
+            self._get_jwt_signing_or_encryption_key(private=False, year=next_year)
+        self.get_encryption_key(self.encryption_algorithm, year=next_year)
+        return True
+
+    def _provision_next_year_keys_periodically(self):
+        """
+        Calls `provision_next_year_keys` at most once an hour per process
+        """
+        now = time.monotonic()
+        if now < TokenKey._next_rotation_check:
+            return
+        TokenKey._next_rotation_check = now + 3600
+        self.provision_next_year_keys()
+
+    def _get_key_by_id(self, algorithm, purpose, key_id, load):
+        """
+        Looks up a key in the `key_ring` by its id. Keys of retained years that were never loaded by the
+        process(e.g. last year's keys) are loaded with `load`(accepting a year) only if the lookup fails
+        """
+        found = self.key_ring.find(algorithm, purpose, key_id)
+        if found is None:
+            for year in self.get_retained_years():
+                try:
+                    load(year)
+                except FileNotFoundError:
+                    pass
+            found = self.key_ring.find(algorithm, purpose, key_id)
+        if found is None:
+            return None
+        (_, _, year), key = found
+        if year is not None and year not in self.get_retained_years():
+            # retired
+            return None
+        return key
+
+    def preload(self):
+        """
+        Loads(generating missing ones) the signing and encryption keys of the configured algorithms into the
+        `key_ring` and validates them. Meant to be called once at startup(e.g. before a server forks its workers)
+        so that requests don't pay for reading and unwrapping the keys. Public signing keys that do not belong to
+        their private key(earlier versions generated the two independently) are regenerated from the private key
+
+        :raises ImproperlyConfigured if the encryption key cannot decrypt
+        """
+        self._jwt_signing_keys_pair()
+        if self.signing_algorithm != 'HS256':
+            for year in self.get_retained_years():
+                self._derive_public_signing_key(year)
+        encryption_key = self.encryption_key
+        if not encryption_key.has_private and encryption_key.key_type != 'oct':
+            raise ImproperlyConfigured(f'{self.encryption_algorithm} encryption key cannot be used for decryption')
+        self.provision_next_year_keys()
+
+    def _derive_public_signing_key(self, year: int) -> bool:
+        """
+        Replaces `year`'s public signing key file with the public part of its private key unless it already is
+
+        :return: True if the public key file was replaced
+        """
+        try:
+            private = self._get_jwt_signing_or_encryption_key(provision=False, year=year)
+            public = self._get_jwt_signing_or_encryption_key(private=False, provision=False, year=year)
+        except FileNotFoundError:
+            return False
+        if private.thumbprint() == public.thumbprint():
+            return False
+        file_name, path = self._get_signing_or_encryption_key_filename_and_path(False, False)
+        self._provision_key_file(os.path.join(path, f'{file_name}_{year}.pem'),
+                                 lambda: self._export_public_pem(private), replace=True)
+        return True
+
+    def _jwt_signing_keys_pair(self):
+        """
+        :return: tuple of (`private`, `public`) signing keys as stored. Unlike `_jwt_signing_keys`, the public key
+        is never substituted with the private key
+        """
+        if self.signing_algorithm == 'HS256':
+            key = self._get_default_signing_key()
+            return key, key
+        return self._get_jwt_signing_or_encryption_key(), self._get_jwt_signing_or_encryption_key(False)
 
     @property
     def private_signing_key(self):
@@ -41,6 +252,8 @@ class TokenKey:
 
     @property
     def public_signing_key(self):
+        if self.verifies_with_public_keys and self.signing_algorithm != 'HS256':
+            return self._get_jwt_signing_or_encryption_key(False)
         return self._jwt_signing_keys()[1]
 
     def _jwt_signing_keys(self):
@@ -68,38 +281,114 @@ class TokenKey:
         # Use the same key(private) for **signing** and **verifying** keys...
         return jwt_pri_sig_key, jwt_pri_sig_key or jwt_pub_sig_key
 
-    def _get_jwt_signing_or_encryption_key(self, private=True, encryption=False) -> jwk.JWK:
+    def _get_jwt_signing_or_encryption_key(self, private=True, encryption=False, provision=True,
+                                           year=None) -> jwk.JWK:
         """
         Creates a `private` signing or encryption key(s)
 
         :param private: `bool` to specifying if `key` is `private key`
+        :param provision: if False, FileNotFoundError is raised instead of creating a missing key
+        :param year: year the key is used in. Defaults to the current year
         :return: `jwk.JWK` Encryption & signing key
         """
 
-        file_name, path, key = self._get_signing_or_encryption_key_or_path(private, encryption)
-        file = os.path.join(path, f'{file_name}_{datetime.now().year}.pem')
+        file_name, path = self._get_signing_or_encryption_key_filename_and_path(private, encryption)
+        year = datetime.now().year if year is None else year
+        file = os.path.join(path, f'{file_name}_{year}.pem')
+        ring_key = self._get_ring_key(private, encryption, year)
 
         try:
-            self._make_dirs_if_not_exist(path)
-            # get key from .pem file contents
-            key = self._get_key_from_pem(file, private)
+            # get key from the key ring or .pem file contents
+            key = self._get_key_from_ring(ring_key, file, private)
         except FileNotFoundError:
-            # Key file not found! Create new
-            key = self._create_pem_file(file, key, private)
+            if not provision:
+                raise
+            # Key file not found! Create new. Keys are only generated at this point since generation is costly
+            self._make_dirs_if_not_exist(path)
+            if private or encryption:
+                self._provision_key_file(file, lambda: self._generate_pem(private, encryption, year))
+            else:
+                # a public signing key is derived from the private signing key. The private key is provisioned
+                # first since its directory cannot be locked again while provisioning the public key
+                private_key = self._get_jwt_signing_or_encryption_key(private=True, year=year)
+                self._provision_key_file(file, lambda: self._export_public_pem(private_key))
+            key = self._get_key_from_ring(ring_key, file, private)
 
         return key
 
-    def _get_signing_or_encryption_key_or_path(self, private: bool, encryption: bool):
+    def _get_symmetric_encryption_key(self, algorithm: str, provision: bool = True, year: int = None) -> jwk.JWK:
+        """
+        {"k":"VXijve0VHZY1*******IYwGDFTlo1s3PA","kty":"oct"}
+        """
+        year = datetime.now().year if year is None else year
+        path = os.path.join(self.KEYS_ROOT_PATH, 'enc')
+        file = os.path.join(path, f'key_{algorithm.lower()}_{year}.txt')
+        ring_key = (algorithm, 'encrypt', year)
+        try:
+            return self.key_ring.get(ring_key, file, self._get_key_from_txt, key_id=self.get_key_id)
+        except FileNotFoundError:
+            if not provision:
+                raise
+            self._make_dirs_if_not_exist(path)
+            self._provision_key_file(file, lambda: jwk.JWK(generate='oct', size=256).export().encode())
+            return self.key_ring.get(ring_key, file, self._get_key_from_txt, key_id=self.get_key_id)
+
+    def _get_ring_key(self, private: bool, encryption: bool, year: int = None):
+        """
+        :return: tuple of (algorithm, purpose, year) identifying a key in the `key_ring`
+        """
+        if encryption:
+            return self.ENCRYPTION_ALGORITHM, 'encrypt', year
+        return self.signing_algorithm, 'sign' if private else 'verify', year
+
+    def _get_key_from_ring(self, ring_key, file, private) -> jwk.JWK:
+        return self.key_ring.get(ring_key, file, lambda f: self._get_key_from_pem(f, private),
+                                 password=self.__password(private), key_id=self.get_key_id)
+
+    @staticmethod
+    def get_key_id(key: jwk.JWK) -> str:
+        """
+        :return: `kid` of `key` i.e. its RFC 7638 thumbprint. Public and private keys of a pair share the same id.
+        The thumbprint of a symmetric('oct') key is a digest of the secret itself so its id is an HMAC of a fixed
+        label under the key instead, which reveals nothing about the key
+        """
+        if key.get('kty') == 'oct':
+            digest = hmac.new(base64url_decode(key['k']), b'xauth.utils.token.key-id', hashlib.sha256).digest()
+            return base64url_encode(digest)
+        return key.thumbprint()
+
+    def _get_signing_or_encryption_key_filename_and_path(self, private: bool, encryption: bool):
         path = self.KEYS_ROOT_PATH
         file_name = 'key'
         if encryption:
             path += '/enc'  # `Encryption` keys directory
-            key = jwk.JWK.generate(kty='EC', alg='ECDH-ES', crv='P-256')
         else:
             path += '/sig'  # `Signing` keys directory
-            file_name, key_op = self._get_key_op_and_filename_suffix(file_name, private)
-            key = jwk.JWK.generate(kty='RSA', key_ops=key_op, alg='RSA-OAEP', size=2048)
-        return file_name, path, key
+            file_name, _ = self._get_key_op_and_filename_suffix(file_name, private)
+            if self.signing_algorithm != 'RS256':
+                # RS256 keys retain their original file names
+                file_name += f'_{self.signing_algorithm.lower()}'
+        return file_name, path
+
+    def _generate_pem(self, private: bool, encryption: bool, year: int = None) -> bytes:
+        """
+        Generates a new private signing or encryption key and returns its `.pem` file contents. Public signing
+        keys are never generated but derived from the private signing key(see `_export_public_pem`) so that the
+        two always form a pair
+        """
+        assert private or encryption, 'public signing keys are derived from the private signing key'
+        if encryption:
+            key = jwk.JWK.generate(kty='EC', alg='ECDH-ES', crv='P-256')
+        else:
+            _, key_op = self._get_key_op_and_filename_suffix('key', private)
+            key = jwk.JWK.generate(key_ops=key_op, **self.SIGNING_KEY_PARAMETERS[self.signing_algorithm])
+        return key.export_to_pem(private_key=True, password=self.__password(True))
+
+    def _export_public_pem(self, private_key: jwk.JWK) -> bytes:
+        """
+        :return: `.pem` file contents of the public part of `private_key`
+        """
+        return private_key.export_to_pem(private_key=False, password=self.__password(False))
 
     @staticmethod
     def _get_key_op_and_filename_suffix(file_name, private):
@@ -116,28 +405,68 @@ class TokenKey:
     @staticmethod
     def _make_dirs_if_not_exist(dirs):
         if not os.path.exists(dirs):
-            # make the required directories if they don't exist
-            os.makedirs(dirs)
+            # make the required directories if they don't exist. Tolerates concurrent creation by other workers
+            os.makedirs(dirs, exist_ok=True)
+
+    @staticmethod
+    def _provision_key_file(file, create, replace: bool = False):
+        """
+        Atomically creates key `file` with contents returned by `create` unless it already exists(and `replace`
+        is False).
+
+        Creation is serialized across processes(e.g. several gunicorn workers starting at once) with an exclusive
+        lock on `file`'s directory and the contents are written to a temporary file that is renamed to `file`
+        so that a partially written key is never read. The worker that loses the race uses the winner's key
+        instead of writing(and thereby invalidating tokens signed with) a different one
+
+        :param file: path of the key file
+        :param create: callable returning the key file contents as bytes. It must not provision another key file
+        of the same directory i.e. take the same lock again
+        :param replace: if True, an existing `file` is replaced
+        """
+        directory = os.path.dirname(file)
+        # directories can be locked(but not opened) on POSIX only
+        lock = os.open(directory, os.O_RDONLY) if fcntl else None
+        try:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            if not replace and os.path.exists(file):
+                # provisioned by another worker while we waited for the lock
+                return
+            tmp = os.path.join(directory, f'.{os.path.basename(file)}.{uuid.uuid4().hex}.tmp')
+            # created with the same permissions as `open()` would i.e. 0o666 restricted by the process' umask
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+            try:
+                with os.fdopen(fd, 'wb') as tmp_file:
+                    tmp_file.write(create())
+                    tmp_file.flush()
+                    os.fsync(tmp_file.fileno())
+                os.replace(tmp, file)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+        finally:
+            if lock is not None:
+                # closing the descriptor releases the lock
+                os.close(lock)
 
     def _get_default_signing_key(self) -> jwk.JWK:
         """
         {"k":"VXijve0VHZY1*******IYwGDFTlo1s3PA","kty":"oct"}
         """
+        file, ring_key = f'{self.KEYS_ROOT_PATH}/signing_key.txt', self._get_ring_key(True, False)
         try:
-            self._make_dirs_if_not_exist(self.KEYS_ROOT_PATH)
-            with open(f'{self.KEYS_ROOT_PATH}/signing_key.txt', 'rb') as file:
-                return jwk.JWK(**json_decode(file.readline()))
+            return self.key_ring.get(ring_key, file, self._get_key_from_txt, key_id=self.get_key_id)
         except FileNotFoundError:
-            key = jwk.JWK(generate='oct', size=256)
-            with open(f'{self.KEYS_ROOT_PATH}/signing_key.txt', 'wb') as file:
-                file.write(key.export().encode())
-            return key
+            self._make_dirs_if_not_exist(self.KEYS_ROOT_PATH)
+            self._provision_key_file(file, lambda: jwk.JWK(generate='oct', size=256).export().encode())
+            return self.key_ring.get(ring_key, file, self._get_key_from_txt, key_id=self.get_key_id)
 
-    def _create_pem_file(self, file, key, private) -> jwk.JWK:
-        with open(file, 'wb') as pem:
-            # Write the key's to .pem file
-            pem.write(key.export_to_pem(private_key=private, password=self.__password(private)))
-        return self._get_key_from_pem(file, private)
+    @staticmethod
+    def _get_key_from_txt(file) -> jwk.JWK:
+        with open(file, 'rb') as txt:
+            return jwk.JWK(**json_decode(txt.readline()))
 
     def _get_key_from_pem(self, file, private) -> jwk.JWK:
         """
@@ -160,13 +489,26 @@ class Token(TokenKey):
     :param expiry_period `datetime` when the generated token should be considered in[active/valid] and not usable.
     Defaults to 60days from `activation_date` if an alternative is not provided
     :param payload_key key for `payload` during claims generations
+    :param on_issue callable invoked with the `Token` whenever its `normal` or `encrypted` token is generated
     """
     __TOKEN_ENCRYPTED = settings.XAUTH.get('REQUEST_TOKEN_ENCRYPTED', True)
+    # token type(s) returned to clients. Decides which of `normal` and `encrypted` are included in `tokens`
+    RETURN_TOKEN_TYPE = TokenType(settings.XAUTH.get('RETURN_TOKEN_TYPE', TokenType.BOTH.value))
+    # encodes & decodes tokens of the profiles it supports without going through jwcrypto. None always uses jwcrypto
+    codec = CompactTokenCodec() if settings.XAUTH.get('COMPACT_TOKEN_CODEC', True) else None
+    # issues tokens through a local `SigningService` instead of signing & encrypting them in the current process,
+    # which then verifies tokens with the public signing keys and only loads the private signing keys to issue
+    # tokens locally while falling back. None issues tokens locally
+    signing_client = SigningClient.from_settings(settings.XAUTH.get('SIGNING_SERVICE'))
+    # if True, `encrypted` tokens are compressed('zip': 'DEF') before encryption. Compressed tokens are always accepted
+    COMPRESS_ENCRYPTED_TOKEN = settings.XAUTH.get('COMPRESS_ENCRYPTED_TOKEN', False)
 
     def __init__(self, payload, activation_date: datetime = None, expiry_period: timedelta = None,
-                 payload_key: str = 'payload', signing_algorithm=JWT_SIG_ALG, subject=None, ):
+                 payload_key: str = 'payload', signing_algorithm=JWT_SIG_ALG, subject=None, on_issue=None,
+                 encryption_algorithm=JWT_ENC_ALG, ):
         password = settings.XAUTH.get('TOKEN_KEY', force_str(settings.SECRET_KEY))
-        super().__init__(password=password, signing_algorithm=signing_algorithm)
+        super().__init__(password=password, signing_algorithm=signing_algorithm,
+                         encryption_algorithm=encryption_algorithm)
         self._normal = None
         self._encrypted = None
         self.subject = subject if subject else 'res-man'  # resource manipulation
@@ -174,6 +516,11 @@ class Token(TokenKey):
         self.payload_key = payload_key
         self.activation_date = activation_date
         self.expiry_period = expiry_period
+        self.on_issue = on_issue
+
+    @property
+    def verifies_with_public_keys(self) -> bool:
+        return self.signing_client is not None
 
     def __str__(self):
         # self.__repr__() # makes sure
@@ -185,19 +532,28 @@ class Token(TokenKey):
     @property
     def normal(self):
         """
-        :return: unencrypted token
+        :return: unencrypted(signed) token. Signing only happens on first access
         """
         if self._normal is None:
-            self.refresh()
+            if self.signing_client is not None:
+                # encrypted in the same round trip if it is returned to clients
+                self._issue_remotely('encrypted' in self.get_token_names(self.RETURN_TOKEN_TYPE))
+            else:
+                self._normal = self._make_signed_token()
+            self._issued()
         return self._normal
 
     @property
     def encrypted(self):
         """
-        :return: encrypted token
+        :return: encrypted token. Encryption(of `normal`) only happens on first access
         """
         if self._encrypted is None:
-            self.refresh()
+            if self.signing_client is not None:
+                self._issue_remotely(True)
+            else:
+                self._encrypted = self._make_encrypted_token(self.normal)
+            self._issued()
         return self._encrypted
 
     @property
@@ -230,21 +586,138 @@ class Token(TokenKey):
         # self.payload = str(self.payload) if not isinstance(self.payload, dict) else self.payload
         cc = self.checked_claims
         cc[self.payload_key] = self.payload
+        # identifies the token for revocation
+        cc['jti'] = uuid.uuid4().hex
         return cc
 
     @property
     def tokens(self):
-        if not self.normal or not self.encrypted:
-            self.refresh()
-        return dict(normal=self.normal, encrypted=self.encrypted)
+        """
+        :return: dict of `normal` and/or `encrypted` tokens depending on `RETURN_TOKEN_TYPE`. Token types
+        that are not returned are never computed
+        """
+        return {name: getattr(self, name) for name in self.get_token_names(self.RETURN_TOKEN_TYPE)}
+
+    @staticmethod
+    def get_token_names(token_type: TokenType = None) -> tuple:
+        """
+        :param token_type: defaults to `RETURN_TOKEN_TYPE`
+        :return: tuple of names of the token types(`normal`, `encrypted`) to be returned for `token_type`
+        """
+        token_type = Token.RETURN_TOKEN_TYPE if token_type is None else token_type
+        if token_type == TokenType.ENCRYPTED:
+            return 'encrypted',
+        if token_type == TokenType.NORMAL:
+            return 'normal',
+        return 'normal', 'encrypted',
 
     def get_claims(self, token=None, encrypted: bool = __TOKEN_ENCRYPTED):
-        token = self.encrypted if not token else token
+        if not token:
+            token = self.encrypted if encrypted else self.normal
         assert token is not None, "Call refresh() first or provide a token"
         token = token.decode() if isinstance(token, bytes) else token
-        tk = jwt.JWT(key=self.encryption_key, jwt=u"%s" % token).claims if encrypted else token
-        claims = jwt.JWT(key=self.public_signing_key, jwt=tk).claims
-        return json.loads(claims)
+        codec = self.codec
+        # each header is decoded once and the signed token is verified right after it is decrypted
+        if encrypted:
+            header = self._get_header(token, jwe.InvalidJWEData)
+            key = self._get_decryption_key(header)
+            if codec is not None and codec.can_encrypt(header, key):
+                token = codec.decrypt(token, header, key)
+            else:
+                token = jwt.JWT(key=key, jwt=u"%s" % token).claims
+        header = self._get_header(token, jws.InvalidJWSObject)
+        key = self._get_verification_key(header)
+        if codec is not None and codec.can_sign(header, key):
+            return codec.verify(token, key)
+        return json.loads(jwt.JWT(key=key, jwt=token).claims)
+
+    def get_verification_key(self, token: str) -> jwk.JWK:
+        """
+        Gets and returns the key that signed `token` by the `kid` in its header. Tokens without a `kid`(issued
+        before key ids were introduced) are verified with the current key
+
+        :raises jwcrypto.jws.InvalidJWSSignature if `token`'s key is unknown or retired
+        :param token: signed(normal) token
+        """
+        return self._get_verification_key(self._get_header(token, jws.InvalidJWSObject))
+
+    def _get_verification_key(self, header: dict) -> jwk.JWK:
+        key_id = header.get('kid')
+        if key_id is None:
+            return self.public_signing_key
+        key = self.get_verification_key_by_id(key_id)
+        if key is None:
+            raise jws.InvalidJWSSignature(f'unknown or retired key {key_id}')
+        return key
+
+    def get_decryption_key(self, token: str) -> jwk.JWK:
+        """
+        Gets and returns the key needed to decrypt `token` depending on the algorithm and `kid` in its header.
+        Tokens encrypted with any of `ALLOWED_ENCRYPTION_ALGORITHMS` are accepted(e.g. while migrating from one
+        algorithm to another) but keys are only ever generated for `encryption_algorithm`
+
+        :raises jwcrypto.jwe.InvalidJWEData if `token` is malformed or its key does not exist or is retired
+        :param token: encrypted token
+        """
+        return self._get_decryption_key(self._get_header(token, jwe.InvalidJWEData))
+
+    def _get_decryption_key(self, header: dict) -> jwk.JWK:
+        algorithm, key_id = header.get('alg'), header.get('kid')
+        if algorithm not in self.ALLOWED_ENCRYPTION_ALGORITHMS:
+            raise jwe.InvalidJWEData(f'unsupported algorithm {algorithm}')
+        if key_id is not None:
+            key = self.get_decryption_key_by_id(algorithm, key_id)
+            if key is None:
+                raise jwe.InvalidJWEData(f'unknown or retired key {key_id}')
+            return key
+        try:
+            return self.get_encryption_key(algorithm, provision=algorithm == self.encryption_algorithm)
+        except FileNotFoundError as ex:
+            raise jwe.InvalidJWEData(f'{algorithm} key not found', ex)
+
+    @staticmethod
+    def _get_header(token: str, error) -> dict:
+        """
+        :return: unverified header of a compact serialized `token`
+        :raises `error` if `token` is malformed
+        """
+        try:
+            header = json_decode(base64url_decode(token.split('.')[0]))
+        except (ValueError, TypeError, AttributeError) as ex:
+            raise error('malformed token', ex)
+        if not isinstance(header, dict):
+            raise error('malformed token')
+        return header
+
+    @classmethod
+    def is_revoked(cls, token) -> bool:
+        """
+        :param token: signed(normal) token. Its signature is not verified
+        :return: True if `token` was revoked(e.g. on sign out) and should therefore not be handed out again
+        """
+        revocation_list = revocation.revocation_list
+        if revocation_list is None:
+            return False
+        try:
+            claims = json_decode(base64url_decode(token.split('.')[1]))
+        except (ValueError, TypeError, AttributeError, IndexError):
+            return True
+        return isinstance(claims, dict) and revocation_list.is_revoked(claims.get('jti'))
+
+    def revoke(self, token=None, encrypted: bool = __TOKEN_ENCRYPTED):
+        """
+        Revokes `token`(defaults to `encrypted` or `normal`) so that it is rejected during authentication before
+        it expires. Tokens issued without a `jti` claim cannot be revoked. Does nothing(not even verify `token`)
+        if revocation is disabled
+
+        :raises jwcrypto.jwe.JWException if `token` is invalid
+        """
+        revocation_list = revocation.revocation_list
+        if revocation_list is None:
+            return
+        claims = self.get_claims(token, encrypted)
+        if claims.get('jti'):
+            revocation_list.revoke(claims['jti'], claims['exp'])
 
     def get_payload(self, token=None, encrypted: bool = __TOKEN_ENCRYPTED):
         try:
@@ -252,26 +725,134 @@ class Token(TokenKey):
         except AssertionError:
             return self.payload
 
+    @classmethod
+    def issue_many(cls, users, subject: str = None, expiry: timedelta = None, processes: int = None,
+                   chunk_size: int = 100):
+        """
+        Issues tokens for each of `users`(e.g. during migrations or forced rotations) across a pool of processes.
+        `users` are consumed lazily and at most two chunks per process are in flight at any time so memory use does
+        not grow with the number of users(iterate querysets with `.iterator()`)
+
+        :param users: iterable of objects with a `token_payload()` method(e.g. `User`s) or of token payloads
+        :param subject: subject of the tokens
+        :param expiry: expiry period of the tokens. Defaults to `XAUTH['TOKEN_EXPIRY']`
+        :param processes: number of worker processes. Defaults to the number of CPUs. Tokens are issued in the
+        current process if 1 or less
+        :param chunk_size: number of tokens issued per task sent to a worker process
+        :return: generator of (user, tokens) tuples in the order of `users`. `tokens` is as `tokens`
+        """
+        processes = (os.cpu_count() or 1) if processes is None else processes
+        options = {'subject': subject, 'expiry_period': expiry, }
+        users = iter(users)
+        chunks = iter(lambda: list(itertools.islice(users, max(1, chunk_size))), [])
+        if processes <= 1:
+            for chunk in chunks:
+                yield from zip(chunk, cls._issue_chunk(cls, [cls._get_issue_payload(user) for user in chunk], options))
+            return
+        # keys are loaded once and inherited by forked workers instead of being loaded by every worker
+        if cls.signing_client is None:
+            token = cls(None)
+            token.private_signing_key
+            token.encryption_key
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=cls._init_issue_worker) \
+                as executor:
+            pending = deque()
+            for chunk in chunks:
+                payloads = [cls._get_issue_payload(user) for user in chunk]
+                pending.append((chunk, executor.submit(cls._issue_chunk, cls, payloads, options)))
+                if len(pending) >= 2 * processes:
+                    chunk, future = pending.popleft()
+                    yield from zip(chunk, future.result())
+            while pending:
+                chunk, future = pending.popleft()
+                yield from zip(chunk, future.result())
+
+    @staticmethod
+    def _get_issue_payload(user):
+        token_payload = getattr(user, 'token_payload', None)
+        return token_payload() if callable(token_payload) else user
+
+    @staticmethod
+    def _issue_chunk(token_class, payloads: list, options: dict) -> list:
+        return [token_class(payload, **options).tokens for payload in payloads]
+
+    @classmethod
+    def _init_issue_worker(cls):
+        if cls.signing_client is not None:
+            # connection(s) inherited from the parent process are not shared with it
+            cls.signing_client.close()
+
     def refresh(self):
+        """
+        Discards previously generated tokens and generates new ones
+        :return: see `tokens`
+        """
+        self._normal = None
+        self._encrypted = None
+        return self.tokens
+
+    def _issued(self):
+        if self.on_issue is not None:
+            self.on_issue(self)
+
+    def _issue_remotely(self, encrypt: bool):
+        """
+        Signs(unless `normal` was already signed) and encrypts(if `encrypt` is True) tokens through `signing_client`.
+        Tokens are issued locally instead if the signing service is unreachable or fails to issue them and falling
+        back is allowed
+        """
+        client = self.signing_client
+        try:
+            tokens = client.issue(self.signing_algorithm, self.encryption_algorithm,
+                                  claims=self.claims if self._normal is None else None, normal=self._normal,
+                                  encrypt=encrypt)
+        except (OSError, SigningServiceError):
+            if not client.fallback:
+                raise
+            tokens = {'normal': self._normal or self._make_signed_token(), }
+            if encrypt:
+                tokens['encrypted'] = self._make_encrypted_token(tokens['normal'])
+        self._normal = tokens['normal']
+        self._encrypted = tokens.get('encrypted', self._encrypted)
+
+    def _make_signed_token(self, claims: dict = None):
+        """
+        :param claims: defaults to `claims`
+        """
+        self._provision_next_year_keys_periodically()
+        claims = self.claims if claims is None else claims
+        key = self.private_signing_key
         header = {
             'alg': self.signing_algorithm,
             'typ': 'JWT',
+            'kid': self.get_key_id(key),
         }
+        if self.codec is not None and self.codec.can_sign(header, key):
+            return self.codec.sign(header, claims, key)
         # normal(unencrypted) token
-        token = jwt.JWT(header=header, claims=self.claims, check_claims=self.checked_claims,
+        token = jwt.JWT(header=header, claims=claims, check_claims=self.checked_claims,
                         algs=self.ALLOWED_SIGNING_ALGORITHMS)
-        token.make_signed_token(key=self.private_signing_key)
-        self._normal = token.serialize()
+        token.make_signed_token(key=key)
+        return token.serialize()
+
+    def _make_encrypted_token(self, normal):
+        key = self.encryption_key
         header = {
-            'alg': "ECDH-ES",
+            'alg': self.encryption_algorithm,
             'enc': "A256GCM",
+            'kid': self.get_key_id(key),
         }
+        if self.COMPRESS_ENCRYPTED_TOKEN:
+            header['zip'] = 'DEF'
+        if self.codec is not None and self.codec.can_encrypt(header, key):
+            return self.codec.encrypt(header, normal, key)
         # header = settings.XAUTH.get('JWT_ENC_HEADERS', {
         #     "alg": "A256KW",
         #     "enc": "A256CBC-HS512",
         # })
         # encrypted token
-        e_token = jwt.JWT(header=header, claims=self.normal)
-        e_token.make_encrypted_token(key=self.encryption_key)
-        self._encrypted = e_token.serialize()
-        return self.tokens
+        e_token = jwt.JWT(header=header, claims=normal)
+        e_token.make_encrypted_token(key=key)
+        return e_token.serialize()
@@ -0,0 +1,100 @@
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.db import router, transaction
+
+from .cache import BaseCache, get_cache
+from .settings import XAUTH
+
+
+class UserCache:
+    """
+    Caches a slim projection(all concrete fields except the password) of users fetched by primary key during
+    token authentication.
+
+    Every cached projection is stamped with the user's version. Versions live in the Django cache(`alias`) and
+    are replaced whenever a user is saved or deleted(see `xauth.signals`) which invalidates the projections
+    cached by every worker process sharing that cache. Updates that bypass model signals(e.g. `QuerySet.update()`)
+    are only picked up once the projection times out
+
+    :param cache: stores the projections
+    :param timeout: number of seconds a projection is cached for
+    :param alias: name of the cache in `settings.CACHES` holding user versions
+    """
+
+    def __init__(self, cache: BaseCache, timeout: float = 300, alias: str = 'default'):
+        self.cache = cache
+        self.timeout = timeout
+        self.alias = alias
+
+    @classmethod
+    def from_settings(cls, config):
+        """
+        :param config: dict of `get_cache` options plus 'TIMEOUT'. None or an empty dict disables caching
+        :return: `UserCache` or None if caching is disabled
+        """
+        cache = get_cache(config, prefix='xauth:user')
+        if cache is None:
+            return None
+        return cls(cache, timeout=config.get('TIMEOUT', 300), alias=config.get('CACHE_ALIAS', 'default'))
+
+    @property
+    def versions(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    @staticmethod
+    def get_field_names(model) -> tuple:
+        return tuple(f.attname for f in model._meta.concrete_fields if f.attname != 'password')
+
+    def get_version(self, pk):
+        key = self.version_key(pk)
+        version = self.versions.get(key)
+        if version is None:
+            # first time this user is seen. `add` prevents overwriting a version set by another process
+            self.versions.add(key, uuid.uuid4().hex, timeout=None)
+            version = self.versions.get(key)
+        return version
+
+    def get(self, pk):
+        """
+        Gets and returns the user with primary key `pk` from the cache or the database. The user's `password`
+        is deferred and is therefore only fetched from the database when accessed
+
+        :raises DoesNotExist if a user with primary key `pk` does not exist
+        """
+        model = get_user_model()
+        # version has to be read before the database to avoid caching stale data with a newer version
+        version = self.get_version(pk)
+        entry = self.cache.get(pk)
+        if entry is not None and entry[0] == version:
+            _, field_names, values = entry
+            return model.from_db(router.db_for_read(model), field_names, values)
+        user = model.objects.defer('password').get(pk=pk)
+        field_names = self.get_field_names(model)
+        self.cache.set(pk, (version, field_names, tuple(getattr(user, f) for f in field_names)), self.timeout)
+        return user
+
+    def invalidate(self, pk):
+        """
+        Discards projections of user with primary key `pk` cached by all processes
+        """
+        self._bump_version(pk)
+        # bump again after the current transaction(if any) commits. Prevents caching(with the new version)
+        # of data read by other processes before the changes were committed
+        transaction.on_commit(lambda: self._bump_version(pk))
+
+    def _bump_version(self, pk):
+        self.versions.set(self.version_key(pk), uuid.uuid4().hex, timeout=None)
+        self.cache.delete(pk)
+
+    @staticmethod
+    def version_key(pk):
+        return f'xauth:user-version:{pk}'
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+# shared by authentication & the signals invalidating it. None if disabled
+user_cache = UserCache.from_settings(XAUTH.get('USER_CACHE', None))
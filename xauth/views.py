@@ -1,15 +1,21 @@
+import hashlib
+import json
 import re
 
 from django.contrib.auth import logout
 from django.contrib.auth.models import AnonymousUser
 from django.db.models import Q
 from rest_framework import permissions, generics, views, status, viewsets
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
 from .models import Metadata
 from .permissions import *
 from .serializers import *
 from .utils import get_204_wrapped_response, get_wrapped_response, valid_str
+from .utils.settings import XAUTH
+from .utils.reference_token import ReferenceToken
+from .utils.token import Token
 
 
 class SecurityQuestionView(viewsets.ModelViewSet):
@@ -68,6 +74,10 @@ class SignOutView(views.APIView):
         user = request.user
         if user and not isinstance(user, AnonymousUser):
             user.update_or_create_access_log()
+        if isinstance(request.auth, str):
+            # token used to authenticate this request
+            token_class = ReferenceToken if ReferenceToken.is_reference_token(request.auth) else Token
+            token_class(None).revoke(request.auth)
         logout(request)
         return get_wrapped_response(Response({'success': 'signed out'}, status=status.HTTP_200_OK))
 
@@ -254,3 +264,26 @@ class AccountActivationView(AccountActivationRequestView):
                 data, status_code = {'error': message}, status.HTTP_400_BAD_REQUEST
         response = Response(data, status=status_code if status_code else status.HTTP_200_OK)
         return get_wrapped_response(response)
+
+
+class JWKSView(views.APIView):
+    """
+    Publishes the public keys verifying signed(normal) tokens as a JSON Web Key Set so that other services can
+    verify tokens locally(by their `kid`) instead of calling back into the API. The response is not wrapped
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny, ]
+    renderer_classes = [JSONRenderer, ]
+    # N/B: keep lower than `XAUTH['KEY_ROTATION']['PREGENERATE_DAYS']` for next year's keys to reach caches in time
+    max_age = int(XAUTH.get('JWKS_MAX_AGE', 86400))
+
+    def get(self, request, format=None):
+        jwks = Token(None).get_public_jwks()
+        etag = '"%s"' % hashlib.sha256(json.dumps(jwks, sort_keys=True).encode()).hexdigest()
+        if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(jwks, status=status.HTTP_200_OK)
+        response['ETag'] = etag
+        response['Cache-Control'] = f'public, max-age={self.max_age}'
+        return response